@@ -0,0 +1,221 @@
+# api.py
+"""
+API JSON v1 (kiosques, applications mobiles).
+
+- charges utiles compactes : {"columns": [...], "rows": [[...], ...]} ;
+- compression gzip si le client l'accepte ;
+- ETag / Last-Modified dérivés des compteurs `data_version` : une requête
+  conditionnelle sur des données inchangées reçoit un 304 sans qu'aucune
+  requête sur presences ne soit exécutée ;
+- /sync : flux ndjson des modifications depuis un curseur (utils/changelog.py) ;
+- /checkins : pointages par lots envoyés par les bornes (utils/pointage.py).
+"""
+import gzip
+import hashlib
+from datetime import date, datetime, timezone
+
+import numpy as np
+from flask import Blueprint, Response, abort, jsonify, make_response, request, session, stream_with_context
+
+from utils import archives, changelog, pointage, rollup, versions
+from utils.auth import api_login_required
+from utils.calendrier import CALENDRIER, month_bounds, mois_calendrier, parse_month
+from utils.db import get_db
+from utils.grille import load_month_grid
+from utils.roster import get_roster
+from utils.stagiaires import COLONNES, page_args
+
+api = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+GZIP_MIN_BYTES = 1024
+
+
+def _parse_date(valeur):
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        abort(400, description="Date attendue au format AAAA-MM-JJ")
+
+
+def _parse_month(valeur):
+    try:
+        annee, mois = parse_month(valeur)
+        date(annee, mois, 1)
+    except ValueError:
+        abort(400, description="Mois attendu au format AAAA-MM")
+    return annee, mois
+
+
+def conditional(scopes, build):
+    """
+    Répond à une lecture versionnée : `scopes` sont les portées data_version
+    dont dépend la réponse, `build()` produit le dict JSON (appelé seulement
+    si le client n'a pas déjà la version courante).
+    """
+    conn = get_db()
+    etats = [versions.get_version(conn, s) for s in scopes]
+    empreinte = "|".join([request.full_path, session.get("role") or "", str(session.get("user_id"))]
+                         + [f"{s}:{v}" for s, (v, _) in zip(scopes, etats)])
+    etag = hashlib.sha1(empreinte.encode()).hexdigest()[:20]
+    dates = [datetime.fromisoformat(u.rstrip("Z")).replace(tzinfo=timezone.utc, microsecond=0)
+             for _, u in etats if u]
+    last_modified = max(dates) if dates else None
+
+    if request.if_none_match.contains_weak(etag) or (
+            not request.if_none_match and last_modified and request.if_modified_since
+            and last_modified <= request.if_modified_since):
+        response = make_response("", 304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@api.after_request
+def compress(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "gzip" not in request.headers.get("Accept-Encoding", "")
+            or "Content-Encoding" in response.headers):
+        return response
+    donnees = response.get_data()
+    if len(donnees) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(donnees, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(410)
+@api.errorhandler(413)
+def erreur(e):
+    return jsonify(error=e.description), e.code
+
+
+# ---------------- Ressources ----------------
+@api.route("/stagiaires")
+@api_login_required(role="admin")
+def stagiaires():
+    def build():
+        lignes, suivant = get_roster(get_db()).page(**page_args(request.args))
+        return {"columns": COLONNES, "rows": [list(l) for l in lignes], "next": suivant}
+    return conditional([versions.ROSTER], build)
+
+
+@api.route("/presences/<jour>")
+@api_login_required(role="admin")
+def presences_du_jour(jour):
+    """Présences d'une journée : [stagiaire_id, presence, time]."""
+    d = _parse_date(jour)
+
+    def build():
+        conn = get_db()
+        source = archives.presences_source(conn, *month_bounds(d.year, d.month))
+        rows = conn.execute(f"SELECT stagiaire_id, presence, time FROM {source} WHERE date = ? "
+                            "ORDER BY stagiaire_id", (d.isoformat(),)).fetchall()
+        return {"date": d.isoformat(), "columns": ["stagiaire_id", "presence", "time"],
+                "rows": [list(r) for r in rows]}
+    return conditional([versions.month_scope(d.year, d.month)], build)
+
+
+def _grille(annee, mois, stagiaire_id=None):
+    conn = get_db()
+    if stagiaire_id is None:
+        bornes = month_bounds(annee, mois)
+        stagiaires = conn.execute(f"SELECT DISTINCT stagiaire_id FROM {archives.presences_source(conn, *bornes)} "
+                                  "WHERE date >= ? AND date < ? ORDER BY stagiaire_id", bornes).fetchall()
+    else:
+        stagiaires = [(stagiaire_id,)]
+    grid = load_month_grid(conn, annee, mois, stagiaires=stagiaires, stagiaire_id=stagiaire_id)
+    # une ligne par stagiaire : [stagiaire_id, jour1, jour2, ...] (null = non saisi)
+    valeurs = np.where(grid.saisi, grid.values, np.nan).tolist()
+    return {"month": f"{annee:04d}-{mois:02d}", "days": grid.nb_jours,
+            "columns": ["stagiaire_id"] + [str(j) for j in range(1, grid.nb_jours + 1)],
+            "rows": [[s[0]] + [None if v != v else v for v in ligne]
+                     for s, ligne, saisie in zip(grid.stagiaires, valeurs, grid.saisi.any(axis=1)) if saisie]}
+
+
+@api.route("/grille/<mois>")
+@api_login_required(role="admin")
+def grille(mois):
+    annee, mois = _parse_month(mois)
+    stagiaire_id = request.args.get("stagiaire_id", type=int)
+    return conditional([versions.month_scope(annee, mois)], lambda: _grille(annee, mois, stagiaire_id))
+
+
+@api.route("/recap/<mois>")
+@api_login_required(role="admin")
+def recap(mois):
+    annee, mois = _parse_month(mois)
+
+    def build():
+        rows = get_db().execute("""
+            SELECT s.id, s.matricule, s.nom_prenoms, s.bureau, IFNULL(m.total_days, 0),
+                   IFNULL(m.half_days, 0), IFNULL(m.absent_days, 0)
+            FROM stagiaire s
+            LEFT JOIN presence_monthly m ON m.stagiaire_id = s.id AND m.year_month = ?
+            ORDER BY s.matricule""", (rollup.year_month(annee, mois),)).fetchall()
+        return {"month": rollup.year_month(annee, mois),
+                "expected_days": mois_calendrier(get_db(), annee, mois).nb_ouvrables,
+                "columns": ["stagiaire_id", "matricule", "nom_prenoms", "bureau",
+                            "total_days", "half_days", "absent_days"],
+                "rows": [list(r) for r in rows]}
+    return conditional([versions.month_scope(annee, mois), versions.ROSTER, CALENDRIER], build)
+
+
+@api.route("/me/presences/<mois>")
+@api_login_required(role="user")
+def mes_presences(mois):
+    """Grille du mois pour le stagiaire connecté."""
+    annee, mois = _parse_month(mois)
+    sid = session.get("stagiaire_id")
+    if sid is None:
+        abort(404, description="Profil stagiaire introuvable")
+    return conditional([versions.month_scope(annee, mois)], lambda: _grille(annee, mois, sid))
+
+
+@api.route("/sync")
+@api_login_required(role="admin")
+def sync():
+    """
+    Modifications postérieures au curseur `since`, en ndjson, lues par lots.
+    La dernière ligne donne le curseur suivant et s'il reste des modifications.
+    """
+    since = request.args.get("since", 0, type=int)
+    limit = request.args.get("limit", changelog.MAX_LIMIT, type=int)
+    if since < 0 or limit < 1:
+        abort(400, description="since >= 0 et limit >= 1 attendus")
+    conn = get_db()
+    try:
+        changelog.check_cursor(conn, since)
+    except changelog.StaleCursor:
+        abort(410, description="Curseur antérieur au journal conservé : refaire une copie complète")
+    return Response(stream_with_context(changelog.iter_ndjson(conn, since, limit)),
+                    mimetype="application/x-ndjson", headers={"Cache-Control": "no-store"})
+
+
+@api.route("/checkins", methods=["POST"])
+@api_login_required(role=("kiosque", "admin"))
+def checkins():
+    """
+    Lot de pointages d'une borne : {"checkins": [{"matricule", "timestamp"}, ...]}.
+    Réponse : un statut par pointage, dans l'ordre, et les totaux par statut.
+    """
+    corps = request.get_json(silent=True)
+    lot = corps.get("checkins") if isinstance(corps, dict) else None
+    if not isinstance(lot, list):
+        abort(400, description='Corps attendu : {"checkins": [{"matricule": ..., "timestamp": ...}, ...]}')
+    if len(lot) > pointage.BATCH_MAX:
+        abort(413, description=f"Au plus {pointage.BATCH_MAX} pointages par requête")
+    conn = get_db()
+    resultats = pointage.ingest_checkins(conn, get_roster(conn), lot)
+    totaux = {}
+    for statut in resultats:
+        totaux[statut] = totaux.get(statut, 0) + 1
+    return jsonify(results=resultats, counts=totaux)
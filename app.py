@@ -1,63 +1,147 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, session, send_file, jsonify, abort
+import json
+import locale
 import sqlite3, os
+import click
 from datetime import datetime, date, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
-from utils.export_pdf_officiel import generate_etat_presences_pdf  # (optionnel pour export PDF)
-from utils.export_excel_officiel import generate_etat_presences_excel  # (optionnel pour export Excel)
-from calendar import monthrange
-app = Flask(__name__)
-app.secret_key = "CHANGE_THIS_TO_A_RANDOM_SECRET"
-DB = "stagiaires.db"
-# Déconnexion après 10 minutes d'inactivité
-app.permanent_session_lifetime = timedelta(minutes=10)
+from werkzeug.security import check_password_hash
+from utils.auth import login_required, hash_password, needs_rehash, LoginBusy, LoginLimiter, LOGIN_QUEUE_TIMEOUT
+from utils import db as dbpool
+from utils import metrics
+from utils import offload
+from utils.migrations import upgrade as upgrade_schema
+from utils.calendrier import month_bounds, parse_month, mois_calendrier, seed_feries
+from utils import archives
+from utils import changelog
+from utils import rollup
+from utils.saisie_presences import save_presences
+from utils.pointage import CHECKIN_SQL, BATCH_MAX as KIOSQUE_LOT_MAX
+from utils.import_stagiaires import iter_rows, import_stagiaires, import_presences
+from utils import versions
+from utils.export_cache import ExportCache
+from utils import jobs
+from utils.jobs import JobRunner, PDF_MIMETYPE, XLSX_MIMETYPE
+from utils.export_batch import generate_batch_zip, list_bureaux
+from utils.stagiaires import page_args, COLONNES as COLONNES_STAGIAIRE
+from utils.roster import get_roster
+from api import api
+
+# Pages et commandes de l'application ; les générateurs PDF / Excel
+# (ReportLab, xlsxwriter) ne sont importés qu'au premier export
+main = Blueprint("main", __name__, cli_group=None)
+
+_locale_configuree = False
+
+
+def configurer_locale():
+    """Noms de jours en français (strftime("%A") des gabarits), une fois par processus."""
+    global _locale_configuree
+    if _locale_configuree:
+        return
+    try:
+        locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')
+    except locale.Error:
+        # Si la locale française n'est pas dispo, on garde la locale par défaut
+        pass
+    _locale_configuree = True
+
+
+def create_app(database=None):
+    """
+    Construit l'application. Rien de coûteux par worker : le schéma est
+    migré, les pools (SQLite, rendus, tâches) sont créés paresseusement
+    dans chaque processus, ce qui permet de la charger une fois dans le
+    maître gunicorn (preload_app) avant le fork des workers.
+    """
+    app = Flask(__name__)
+    app.secret_key = "CHANGE_THIS_TO_A_RANDOM_SECRET"
+    database = database or os.environ.get("STAGIAIRES_DB", "stagiaires.db")
+    app.config["DATABASE"] = database
+    configurer_locale()
+    dbpool.init_app(app)
+    metrics.init_app(app)
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    upgrade_schema(database)
+    # Cache disque des états PDF/Excel, partagé par les workers
+    export_cache = ExportCache(os.environ.get("EXPORT_CACHE_DIR", os.path.join(app.instance_path, "exports")),
+                               int(os.environ.get("EXPORT_CACHE_MAX_MB", "200")) * 1024 * 1024)
+    app.extensions["export_cache"] = export_cache
+    # Tâches de fond (exports longs) : état en base, rendu dans un pool de processus
+    app.extensions["job_runner"] = JobRunner(database, os.environ.get("JOBS_DIR", os.path.join(app.instance_path, "jobs")),
+                                             max_workers=int(os.environ.get("JOBS_MAX_WORKERS", "2")),
+                                             cache_dir=export_cache.directory, cache_max_bytes=export_cache.max_bytes)
+    app.extensions["login_limiter"] = LoginLimiter()
+    # Déconnexion après 10 minutes d'inactivité
+    app.permanent_session_lifetime = timedelta(minutes=10)
+    return app
+
+def db_path():
+    # Fichier de la base de l'application courante (requête ou commande flask)
+    return current_app.config["DATABASE"]
 
 def db_connect():
-    return sqlite3.connect(DB)
-
-def login_required(role=None):
-    def decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            if "user_id" not in session:
-                flash("Veuillez vous connecter.", "warning")
-                return redirect(url_for("login"))
-            if role and session.get("role") != role:
-                flash("Accès refusé.", "danger")
-                # redirection selon rôle
-                if session.get("role") == "user":
-                    return redirect(url_for("user_profile"))
-                return redirect(url_for("index"))
-            return f(*args, **kwargs)
-        return wrapper
-    return decorator
+    # Connexion de la requête (pool par worker), rendue automatiquement en fin de requête
+    return dbpool.get_db()
+
+def mois_ou_courant(valeur):
+    """
+    'AAAA-MM' -> (annee, mois). Une valeur mal formée ou hors calendrier
+    (« bad », « 2025-13 ») est signalée et remplacée par le mois courant.
+    """
+    try:
+        annee, mois = parse_month(valeur)
+        date(annee, mois, 1)
+    except ValueError:
+        flash("Mois invalide, affichage du mois courant.", "warning")
+        return date.today().year, date.today().month
+    return annee, mois
 
 # ---------------- Authentication ----------------
-@app.route("/login", methods=["GET","POST"])
+@main.route("/login", methods=["GET","POST"])
 def login():
     if request.method == "POST":
         username = request.form["username"].strip()
         password = request.form["password"]
         conn = db_connect(); cur = conn.cursor()
-        cur.execute("SELECT id, password, role, matricule FROM users WHERE username = ?", (username,))
-        row = cur.fetchone(); conn.close()
-        if row and check_password_hash(row[1], password):
+        cur.execute("""SELECT u.id, u.password, u.role, u.matricule, s.id FROM users u
+                       LEFT JOIN stagiaire s ON s.matricule = u.matricule
+                       WHERE u.username = ?""", (username,))
+        row = cur.fetchone()
+        nouveau_hash = None
+        try:
+            # Hachage hors transaction, borné par worker ; rehachage si la méthode configurée a changé
+            with current_app.extensions["login_limiter"].slot():
+                valide = row is not None and check_password_hash(row[1], password)
+                if valide and needs_rehash(row[1]):
+                    nouveau_hash = hash_password(password)
+        except LoginBusy:
+            flash("Trop de connexions en cours, réessayez dans quelques secondes.", "warning")
+            return render_template("login.html"), 503, {"Retry-After": str(int(LOGIN_QUEUE_TIMEOUT) or 1)}
+        if valide:
+            if nouveau_hash:
+                cur.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                            (nouveau_hash, row[0], row[1]))
+                conn.commit()
             session["user_id"] = row[0]
             session["username"] = username
             session["role"] = row[2]
             session["matricule"] = row[3]  # None for admin
+            session["stagiaire_id"] = row[4]  # évite de relire stagiaire à chaque pointage
             flash("Connexion réussie.", "success")
             if row[2] == "admin":
-                return redirect(url_for("index"))
+                return redirect(url_for("main.index"))
+            elif row[2] == "kiosque":
+                return redirect(url_for("main.kiosque"))
             else:
-                return redirect(url_for("user_profile"))
+                return redirect(url_for("main.user_profile"))
         flash("Nom d'utilisateur ou mot de passe incorrect.", "danger")
     return render_template("login.html")
 
-@app.route("/register", methods=["GET","POST"])
+@main.route("/register", methods=["GET","POST"])
 def register():
-    # Permet la création manuelle de comptes (admin ou user)
+    # Permet la création manuelle de comptes (admin, user ou borne kiosque)
     if request.method == "POST":
         username = request.form["username"].strip()
         password = request.form["password"]
@@ -67,42 +151,51 @@ def register():
 
         if password != confirm:
             flash("Les mots de passe ne correspondent pas.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
         if role == "user" and not matricule:
             flash("Le matricule est requis pour un utilisateur.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
 
-        hashed = generate_password_hash(password)
+        hashed = hash_password(password)
         try:
             conn = db_connect(); cur = conn.cursor()
             cur.execute("INSERT INTO users (username, password, role, matricule) VALUES (?, ?, ?, ?)",
                         (username, hashed, role, matricule))
             conn.commit()
-            conn.close()
             flash("Compte créé avec succès.", "success")
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
         except sqlite3.IntegrityError:
             flash("Nom d'utilisateur déjà utilisé.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
     return render_template("register.html")
 
-@app.route("/logout")
+@main.route("/logout")
 def logout():
     session.clear()
     flash("Déconnecté.", "info")
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
 
 # ---------------- Admin area ----------------
-@app.route("/")
+@main.route("/")
 @login_required(role="admin")
 def index():
-    conn = db_connect(); cur = conn.cursor()
-    cur.execute("SELECT id, nom_prenoms, paositra_money, bureau, matricule FROM stagiaire ORDER BY matricule ASC")
-    stagiaires = cur.fetchall(); conn.close()
-    return render_template("index.html", stagiaires=stagiaires, username=session.get("username"))
+    # Première page seulement ; la suite est chargée à la demande via /stagiaires/page
+    conn = db_connect()
+    filtres = page_args(request.args)
+    roster = get_roster(conn)
+    stagiaires, suivant = roster.page(**filtres)
+    return render_template("index.html", stagiaires=stagiaires, suivant=suivant, filtres=filtres,
+                           bureaux=roster.bureaux, username=session.get("username"))
+
+@main.route("/stagiaires/page")
+@login_required(role="admin")
+def stagiaires_page():
+    """Page de stagiaires en JSON (pagination par clé, recherche par préfixe)."""
+    lignes, suivant = get_roster(db_connect()).page(**page_args(request.args))
+    return jsonify(columns=COLONNES_STAGIAIRE, rows=[list(l) for l in lignes], next=suivant)
 
 # Ajouter stagiaire (optionnel : créer un compte user automatiquement)
-@app.route("/ajouter", methods=["POST"])
+@main.route("/ajouter", methods=["POST"])
 @login_required(role="admin")
 def ajouter():
     nom = request.form.get("nom","").strip()
@@ -112,8 +205,10 @@ def ajouter():
 
     if not (nom and bureau and paositra and matricule):
         flash("Tous les champs sont requis.", "warning")
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
 
+    # Mot de passe initial = matricule, haché avant d'ouvrir la transaction d'écriture
+    mot_de_passe = hash_password(matricule)
     try:
         conn = db_connect(); cur = conn.cursor()
         cur.execute("INSERT INTO stagiaire (nom_prenoms, paositra_money, bureau, matricule) VALUES (?, ?, ?, ?)",
@@ -121,17 +216,17 @@ def ajouter():
         # Créer automatiquement l'utilisateur lié (username = matricule, mot de passe initial = matricule)
         try:
             cur.execute("INSERT INTO users (username, password, role, matricule) VALUES (?, ?, ?, ?)",
-                        (matricule, generate_password_hash(matricule), "user", matricule))
+                        (matricule, mot_de_passe, "user", matricule))
         except Exception:
             # si username déjà présent, on ignore (on peut logguer)
             pass
-        conn.commit(); conn.close()
+        conn.commit()
         flash("Stagiaire ajouté.", "success")
     except sqlite3.IntegrityError:
         flash("PAOSITRA MONEY ou Matricule déjà utilisé.", "danger")
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
-@app.route("/modifier/<int:id>", methods=["GET","POST"])
+@main.route("/modifier/<int:id>", methods=["GET","POST"])
 @login_required(role="admin")
 def modifier(id):
     conn = db_connect(); cur = conn.cursor()
@@ -140,59 +235,99 @@ def modifier(id):
         paositra = request.form.get("paositra"); matricule = request.form.get("matricule")
         cur.execute("UPDATE stagiaire SET nom_prenoms=?, paositra_money=?, bureau=?, matricule=? WHERE id=?",
                     (nom, paositra, bureau, matricule, id))
-        conn.commit(); conn.close()
+        conn.commit()
         flash("Stagiaire modifié.", "success")
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
     cur.execute("SELECT id, nom_prenoms, paositra_money, bureau, matricule FROM stagiaire WHERE id=?", (id,))
-    s = cur.fetchone(); conn.close()
+    s = cur.fetchone()
     if not s:
-        flash("Stagiaire introuvable.", "danger"); return redirect(url_for("index"))
+        flash("Stagiaire introuvable.", "danger"); return redirect(url_for("main.index"))
     return render_template("modifier.html", stagiaire=s)
 
-@app.route("/supprimer/<int:id>")
+@main.route("/supprimer/<int:id>")
 @login_required(role="admin")
 def supprimer(id):
-    conn = db_connect(); cur = conn.cursor(); cur.execute("DELETE FROM stagiaire WHERE id=?", (id,)); conn.commit(); conn.close()
-    flash("Stagiaire supprimé.", "info"); return redirect(url_for("index"))
+    conn = db_connect(); cur = conn.cursor(); cur.execute("DELETE FROM stagiaire WHERE id=?", (id,)); conn.commit()
+    flash("Stagiaire supprimé.", "info"); return redirect(url_for("main.index"))
+
+# Import en masse (CSV / XLSX)
+@main.route("/import", methods=["GET","POST"])
+@login_required(role="admin")
+def import_fichier():
+    # L'import (hachage des mots de passe compris) tourne dans une tâche de fond :
+    # un gros fichier dépasserait le timeout du worker s'il était traité dans la requête
+    job_runner = current_app.extensions["job_runner"]
+    if request.method == "POST":
+        fichier = request.files.get("fichier")
+        if not fichier or not fichier.filename:
+            flash("Aucun fichier sélectionné.", "warning")
+            return redirect(url_for("main.import_fichier"))
+        params = {"type": "presences" if request.form.get("type") == "presences" else "stagiaires",
+                  "nom": fichier.filename, "fichier": job_runner.save_upload(fichier)}
+        job_id = job_runner.submit(db_connect(), "import", params)
+        return redirect(url_for("main.import_fichier", job=job_id))
+    rapport = tache = None
+    if request.args.get("job"):
+        tache = jobs.get_job(db_connect(), request.args["job"])
+        if tache is None or tache["kind"] != "import":
+            abort(404)
+        if tache["status"] == jobs.DONE:
+            with open(tache["result_path"], encoding="utf-8") as f:
+                rapport = json.load(f)
+    return render_template("import.html", rapport=rapport, tache=tache, username=session.get("username"))
 
 # Gestion des présences (admin) par date
-def get_stagiaires_simple():
-    conn = db_connect(); cur = conn.cursor(); cur.execute("SELECT id, nom_prenoms, matricule FROM stagiaire ORDER BY matricule ASC"); r = cur.fetchall(); conn.close(); return r
+def get_stagiaires_simple(**filtres):
+    # Une page de (id, nom_prenoms, matricule) + curseur de la page suivante
+    lignes, suivant = get_roster(db_connect()).page(**filtres)
+    return [(l[0], l[1], l[4]) for l in lignes], suivant
 
 def get_presences_for_date(date_str):
-    conn = db_connect(); cur = conn.cursor(); cur.execute("SELECT stagiaire_id, presence FROM presences WHERE date = ?", (date_str,)); d = dict(cur.fetchall()); conn.close(); return d
+    conn = db_connect(); source = archives.presences_source(conn, date_str, date_str[:4] + "-12-31")
+    cur = conn.cursor(); cur.execute(f"SELECT stagiaire_id, presence FROM {source} WHERE date = ?", (date_str,)); d = dict(cur.fetchall()); return d
 
-@app.route("/presences", methods=["GET","POST"])
+@main.route("/presences", methods=["GET","POST"])
 @login_required(role="admin")
 def presences():
-    stagiaires = get_stagiaires_simple()
-    selected_date = request.form.get("date") if request.method=="POST" else date.today().strftime("%Y-%m-%d")
+    filtres = page_args(request.args)
+    stagiaires, suivant = get_stagiaires_simple(**filtres)
+    selected_date = request.form.get("date") if request.method=="POST" else request.args.get("date", date.today().strftime("%Y-%m-%d"))
     pres = get_presences_for_date(selected_date)
-    if request.method=="POST" and "save_presences" in request.form:
-        conn = db_connect(); cur = conn.cursor()
-        for s in stagiaires:
-            sid = s[0]
-            v = request.form.get(f"presence_{sid}")
-            if v is not None:
-                cur.execute("""INSERT INTO presences (stagiaire_id, date, presence)
-                               VALUES (?, ?, ?)
-                               ON CONFLICT(stagiaire_id, date)
-                               DO UPDATE SET presence=excluded.presence""",
-                            (sid, selected_date, float(v)))
-        conn.commit(); conn.close(); flash(f"Présences pour {selected_date} enregistrées.", "success")
+    if request.method=="POST" and "save_presences" in request.form and archives.is_archived(db_connect(), selected_date):
+        flash(f"L'année {selected_date[:4]} est archivée : présences en lecture seule.", "danger")
+    elif request.method=="POST" and "save_presences" in request.form:
+        # Seuls les stagiaires de la page affichée sont postés ; clés mal formées et
+        # identifiants absents de la liste ignorés (pas de présence orpheline)
+        roster = get_roster(db_connect())
+        lignes = []
+        for cle, v in request.form.items():
+            sid = cle[len("presence_"):]
+            if cle.startswith("presence_") and sid.isdigit() and roster.get(int(sid)) is not None:
+                lignes.append((int(sid), selected_date, v))
+        ecrites, ignorees = save_presences(db_connect(), lignes,
+                                           {(sid, selected_date): v for sid, v in pres.items()})
+        flash(f"Présences pour {selected_date} enregistrées ({ecrites} modifiées, {ignorees} inchangées).", "success")
         pres = get_presences_for_date(selected_date)
-    return render_template("presences.html", stagiaires=stagiaires, selected_date=selected_date, presences=pres, username=session.get("username"))
+    return render_template("presences.html", stagiaires=stagiaires, selected_date=selected_date, presences=pres,
+                           suivant=suivant, filtres=filtres, username=session.get("username"))
 
 
-@app.route("/presences_admin", methods=["GET", "POST"])
+@main.route("/presences_admin", methods=["GET", "POST"])
 @login_required(role="admin")
 def presences_admin():
-    conn = sqlite3.connect(DB)
+    conn = db_connect()
     cursor = conn.cursor()
-    cursor.execute("SELECT id, nom_prenoms, matricule FROM stagiaire ORDER BY nom_prenoms ASC")
-    stagiaires = cursor.fetchall()
-
     selected_id = request.args.get("stagiaire_id")
+    # Liste de choix limitée aux résultats de la recherche (+ le stagiaire sélectionné)
+    recherche = request.args.get("q") or None
+    roster = get_roster(conn)
+    lignes, _ = roster.page(q=recherche, sort="nom", limit=200)
+    stagiaires = [(l[0], l[1], l[4]) for l in lignes]
+    if selected_id and not any(str(s[0]) == selected_id for s in stagiaires):
+        selection = roster.get(int(selected_id)) if selected_id.isdigit() else None
+        if selection:
+            stagiaires = [(selection[0], selection[1], selection[4])] + stagiaires
+
     selected_month = request.args.get("month", date.today().strftime("%Y-%m"))
 
     presences_data = {}
@@ -200,161 +335,380 @@ def presences_admin():
 
     if selected_id:
         year, month = map(int, selected_month.split("-"))
-        start_date = date(year, month, 1)
-        days_in_month = monthrange(year, month)[1]
 
-        # Générer uniquement les jours ouvrables (lundi à vendredi)
-        jours = [
-    start_date + timedelta(days=i)
-    for i in range(days_in_month)
-    if (start_date + timedelta(days=i)).weekday() < 5
-]
+        # Générer uniquement les jours ouvrables (lundi à vendredi, hors jours fériés)
+        jours = mois_calendrier(conn, year, month).jours_ouvrables()
 
         # Charger présences existantes
-        cursor.execute("""
-            SELECT date, presence FROM presences
+        debut, fin = month_bounds(year, month)
+        cursor.execute(f"""
+            SELECT date, presence FROM {archives.presences_source(conn, debut, fin)}
             WHERE stagiaire_id = ?
-            AND strftime('%Y-%m', date) = ?
-        """, (selected_id, selected_month))
+            AND date >= ? AND date < ?
+        """, (selected_id, debut, fin))
         presences_data = dict(cursor.fetchall())
 
     if request.method == "POST":
         selected_id = request.form.get("stagiaire_id")
         selected_month = request.form.get("month")
         year, month = map(int, selected_month.split("-"))
-        start_date = date(year, month, 1)
-        days_in_month = monthrange(year, month)[1]
-        jours = [
-            start_date +timedelta(days=i)
-            for i in range(days_in_month)
-            if (start_date +timedelta(days=i)).weekday() < 5
-        ]
-
-        for jour in jours:
-            presence_value = 1 if request.form.get(f"presence_{jour}") else 0
-            cursor.execute("""
-                INSERT INTO presences (stagiaire_id, date, presence)
-                VALUES (?, ?, ?)
-                ON CONFLICT(stagiaire_id, date) DO UPDATE SET presence = excluded.presence
-            """, (selected_id, jour.strftime("%Y-%m-%d"), presence_value))
-        conn.commit()
-        flash("Présences mises à jour avec succès", "success")
-        return redirect(url_for("presences_admin", stagiaire_id=selected_id, month=selected_month))
+        jours = mois_calendrier(conn, year, month).jours_ouvrables()
 
-    conn.close()
-    return render_template("presences_admin.html", stagiaires=stagiaires, jours=jours,
+        debut, fin = month_bounds(year, month)
+        if archives.is_archived(conn, debut):
+            flash(f"L'année {year} est archivée : présences en lecture seule.", "danger")
+            return redirect(url_for("main.presences_admin", stagiaire_id=selected_id, month=selected_month))
+        cursor.execute("""
+            SELECT stagiaire_id, date, presence FROM presences
+            WHERE stagiaire_id = ? AND date >= ? AND date < ?
+        """, (selected_id, debut, fin))
+        existantes = {(sid, d): p for sid, d, p in cursor.fetchall()}
+        lignes = [(selected_id, jour.strftime("%Y-%m-%d"), 1 if request.form.get(f"presence_{jour}") else 0)
+                  for jour in jours]
+        ecrites, ignorees = save_presences(conn, lignes, existantes)
+        flash(f"Présences mises à jour avec succès ({ecrites} modifiées, {ignorees} inchangées)", "success")
+        return redirect(url_for("main.presences_admin", stagiaire_id=selected_id, month=selected_month))
+
+    return render_template("presences_admin.html", stagiaires=stagiaires, jours=jours, recherche=recherche,
                            presences_data=presences_data,
                            selected_id=selected_id, selected_month=selected_month)
 
 # ---------------- User area ----------------
-@app.route("/user/profile")
+@main.route("/user/profile")
 @login_required(role="user")
 def user_profile():
-    matricule = session.get("matricule")
-    conn = db_connect(); cur = conn.cursor()
-    cur.execute("SELECT id, nom_prenoms, matricule FROM stagiaire WHERE matricule = ?", (matricule,))
-    s = cur.fetchone(); conn.close()
+    s = get_roster(db_connect()).by_matricule(session.get("matricule"))
+    if s:
+        s = (s[0], s[1], s[4])
     return render_template("user_profile.html", stagiaire=s, username=session.get("username"))
 
-@app.route("/user/presence", methods=["POST"])
+@main.route("/user/presence", methods=["POST"])
 @login_required(role="user")
 def user_presence():
-    matricule = session.get("matricule")
     now = datetime.now()
     date_str = now.strftime("%Y-%m-%d")
     conn = db_connect(); cur = conn.cursor()
-    cur.execute("SELECT id FROM stagiaire WHERE matricule = ?", (matricule,))
-    row = cur.fetchone()
-    if not row:
-        conn.close(); flash("Profil stagiaire introuvable.", "danger"); return redirect(url_for("user_profile"))
-    sid = row[0]
-    cur.execute("SELECT 1 FROM presences WHERE stagiaire_id = ? AND date = ?", (sid, date_str))
-    if cur.fetchone():
-        conn.close(); flash("Présence déjà enregistrée aujourd'hui.", "info"); return redirect(url_for("user_profile"))
-    cur.execute("INSERT INTO presences (stagiaire_id, date, presence) VALUES (?, ?, ?)", (sid, date_str, 1.0))
-    conn.commit(); conn.close(); flash("Présence enregistrée !", "success"); return redirect(url_for("user_profile"))
-
-@app.route("/user/presences")
+    sid = session.get("stagiaire_id")
+    if sid is None:
+        # session ouverte avant la mise en cache de l'id
+        row = get_roster(conn).by_matricule(session.get("matricule"))
+        if not row:
+            flash("Profil stagiaire introuvable.", "danger"); return redirect(url_for("main.user_profile"))
+        sid = session["stagiaire_id"] = row[0]
+    # Une seule instruction idempotente : un double clic ne peut pas violer la clé (stagiaire_id, date)
+    cur.execute(CHECKIN_SQL, (date_str, now.strftime("%H:%M:%S"), sid))
+    inserted = cur.rowcount == 1
+    conn.commit()
+    if inserted:
+        flash("Présence enregistrée !", "success")
+    elif get_roster(conn).get(sid) is None:
+        session.pop("stagiaire_id", None)
+        flash("Profil stagiaire introuvable.", "danger")
+    else:
+        flash("Présence déjà enregistrée aujourd'hui.", "info")
+    return redirect(url_for("main.user_profile"))
+
+@main.route("/kiosque")
+@login_required(role=("kiosque", "admin"))
+def kiosque():
+    # Borne de pointage : file locale (localStorage) envoyée par lots à /api/v1/checkins
+    return render_template("kiosque.html", lot_max=min(200, KIOSQUE_LOT_MAX), username=session.get("username"))
+
+@main.route("/user/presences")
 @login_required(role="user")
 def user_presences():
     matricule = session.get("matricule")  # récupérer le matricule de la session
-    mois = request.args.get("mois", date.today().strftime("%Y-%m"))
+    annee, m = mois_ou_courant(request.args.get("mois", date.today().strftime("%Y-%m")))
+    mois = f"{annee:04d}-{m:02d}"
 
-    conn = sqlite3.connect(DB)
+    conn = db_connect()
     cursor = conn.cursor()
 
     # On récupère l'id du stagiaire à partir du matricule
-    cursor.execute("SELECT id FROM stagiaire WHERE matricule = ?", (matricule,))
-    row = cursor.fetchone()
+    row = get_roster(conn).by_matricule(matricule)
     if not row:
-        conn.close()
         flash("Stagiaire introuvable.", "danger")
-        return redirect(url_for("user_profile"))
+        return redirect(url_for("main.user_profile"))
 
     stagiaire_id = row[0]
 
     # Maintenant on récupère les présences pour ce stagiaire
-    cursor.execute("""
-        SELECT date, presence FROM presences
-        WHERE stagiaire_id = ? AND strftime('%Y-%m', date) = ?
+    debut, fin = month_bounds(annee, m)
+    cursor.execute(f"""
+        SELECT date, presence FROM {archives.presences_source(conn, debut, fin)}
+        WHERE stagiaire_id = ? AND date >= ? AND date < ?
         ORDER BY date ASC
-    """, (stagiaire_id, mois))
+    """, (stagiaire_id, debut, fin))
 
     presences = cursor.fetchall()
-    conn.close()
 
     return render_template("user_presences.html", presences=presences, mois_selectionne=mois)
 
 
 
 # ---------------- Recap & Export (admin) ----------------
-@app.route("/recap", methods=["GET","POST"])
+@main.route("/recap", methods=["GET","POST"])
 @login_required(role="admin")
 def recap():
     mois = request.form.get("mois", datetime.today().strftime("%m"))
     annee = request.form.get("annee", datetime.today().strftime("%Y"))
+    a, m = mois_ou_courant(f"{annee}-{mois}")
+    annee, mois = str(a), f"{m:02d}"
     conn = db_connect(); cur = conn.cursor()
-    cur.execute("""SELECT s.nom_prenoms, s.matricule, s.bureau, IFNULL(SUM(p.presence),0) as total_jours
+    # Lecture de la synthèse mensuelle : une ligne par stagiaire, sans agréger presences
+    cur.execute("""SELECT s.nom_prenoms, s.matricule, s.bureau, IFNULL(m.total_days,0) as total_jours,
+                          IFNULL(m.half_days,0), IFNULL(m.absent_days,0)
                    FROM stagiaire s
-                   LEFT JOIN presences p ON s.id = p.stagiaire_id
-                       AND strftime('%m', p.date) = ? AND strftime('%Y', p.date) = ?
-                   GROUP BY s.id ORDER BY s.matricule""", (mois, annee))
-    data = cur.fetchall(); conn.close()
-    return render_template("recap.html", recap_data=data, mois=mois, annee=annee, username=session.get("username"))
-
-@app.route("/export/presences/pdf", methods=["GET","POST"])
+                   LEFT JOIN presence_monthly m ON m.stagiaire_id = s.id AND m.year_month = ?
+                   ORDER BY s.matricule""", (rollup.year_month(annee, mois),))
+    # Taux de présence : jours présents / jours ouvrables du mois (fériés exclus)
+    attendus = mois_calendrier(conn, annee, mois).nb_ouvrables
+    data = [ligne + (attendus, round(100 * ligne[3] / attendus) if attendus else None)
+            for ligne in cur.fetchall()]
+    return render_template("recap.html", recap_data=data, mois=mois, annee=annee, jours_attendus=attendus,
+                           username=session.get("username"))
+
+def send_cached_export(fmt, mois, annee, render, mimetype, download_name):
+    """
+    Sert un état mensuel depuis le cache disque, en le générant seulement si
+    les données du mois (ou la liste des stagiaires) ont changé depuis.
+    L'ETag est la clé du cache : If-None-Match -> 304 sans relire la base.
+    """
+    version = versions.month_version(db_connect(), annee, mois)
+    key = ExportCache.key(fmt, annee, mois, version)
+    export_cache = current_app.extensions["export_cache"]
+    fichier = export_cache.get(key)
+    if fichier is None:
+        # Rendu dans le pool de threads borné : les autres requêtes du worker continuent
+        with offload.run(render) as sortie:
+            fichier = export_cache.put(key, sortie)
+    response = send_file(fichier, as_attachment=True, mimetype=mimetype,
+                         download_name=download_name, etag=key, conditional=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@main.route("/export/presences/pdf", methods=["GET","POST"])
 @login_required(role="admin")
 def export_presences_pdf():
-    if request.method == "POST":
-        mois = request.form.get("mois"); annee = request.form.get("annee")
-        output = generate_etat_presences_pdf(DB, mois, annee)
-        if os.path.exists(output):
-            return send_file(output, as_attachment=True, download_name=os.path.basename(output))
-        flash("Erreur génération PDF", "danger"); return redirect(url_for("export_presences_pdf"))
+    # GET ?mois=..&annee=.. : téléchargement (réponse conditionnelle possible) ; GET seul : formulaire
+    mois = request.values.get("mois"); annee = request.values.get("annee")
+    if mois and annee:
+        # Import au premier export : ReportLab n'est pas chargé au démarrage du worker
+        from utils.export_pdf_officiel import generate_etat_presences_pdf
+        base = db_path()  # le rendu tourne dans un autre thread, hors du contexte de la requête
+        try:
+            # PDF rendu en mémoire puis mis en cache (aucun fichier dans le répertoire courant)
+            return send_cached_export("pdf", mois, annee,
+                                      lambda: generate_etat_presences_pdf(base, mois, annee),
+                                      PDF_MIMETYPE, f"Etat_présences_{annee}_{mois.zfill(2)}.pdf")
+        except Exception as e:
+            flash(f"Erreur génération PDF : {e}", "danger"); return redirect(url_for("main.export_presences_pdf"))
     return render_template("export_presences_pdf.html", username=session.get("username"))
 
-@app.route("/export/presences/excel", methods=["GET","POST"])
+@main.route("/export/presences/excel", methods=["GET","POST"])
 @login_required(role="admin")
 def export_presences_excel():
-    if request.method == "POST":
-        mois = request.form.get("mois")
-        annee = request.form.get("annee")
+    mois = request.values.get("mois")
+    annee = request.values.get("annee")
+    if mois and annee:
+        from utils.export_excel_officiel import generate_etat_presences_excel
+        base = db_path()
         try:
-            output = generate_etat_presences_excel(DB, mois, annee)
-
-            # Envoi direct du BytesIO
-            return send_file(
-                output,
-                as_attachment=True,
-                download_name=f"Etat_presences_{annee}_{mois.zfill(2)}.xlsx",
-                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            return send_cached_export("xlsx", mois, annee,
+                                      lambda: generate_etat_presences_excel(base, mois, annee),
+                                      XLSX_MIMETYPE, f"Etat_presences_{annee}_{mois.zfill(2)}.xlsx")
         except Exception as e:
             flash(f"Erreur génération Excel : {e}", "danger")
-            return redirect(url_for("export_presences_excel"))
+            return redirect(url_for("main.export_presences_excel"))
 
     return render_template("export_presences_excel.html", username=session.get("username"))
 
+@main.route("/export/batch", methods=["GET","POST"])
+@login_required(role="admin")
+def export_batch():
+    """États de plusieurs mois, un document par bureau, regroupés dans un ZIP (tâche de fond)."""
+    if request.method == "POST":
+        try:
+            debut = parse_month(request.form["debut"]); fin = parse_month(request.form["fin"])
+        except (KeyError, ValueError):
+            return jsonify(error="Période invalide"), 400
+        if not all(1 <= m <= 12 for _, m in (debut, fin)):
+            return jsonify(error="Période invalide"), 400
+        if fin < debut:
+            return jsonify(error="La fin de période précède le début"), 400
+        formats = [f for f in request.form.getlist("formats") if f in ("pdf", "xlsx")] or ["pdf"]
+        # Rendu dans le pool de tâches : le worker web rend la main tout de suite
+        params = {"debut": f"{debut[0]:04d}-{debut[1]:02d}", "fin": f"{fin[0]:04d}-{fin[1]:02d}",
+                  "bureaux": request.form.getlist("bureaux"), "formats": formats,
+                  "par_bureau": "par_bureau" in request.form}
+        job_id = current_app.extensions["job_runner"].submit(db_connect(), "batch", params)
+        return jsonify(jobs=[{"id": job_id, "status_url": url_for("main.job_status", job_id=job_id)}]), 202
+    return render_template("export_batch.html", bureaux=list_bureaux(db_connect()),
+                           mois_courant=date.today().strftime("%Y-%m"), username=session.get("username"))
+
+# ---------------- Tâches de fond ----------------
+@main.route("/jobs/export", methods=["POST"])
+@login_required(role="admin")
+def submit_export_job():
+    """Lance un export par mois demandé (plusieurs mois = tâches en parallèle)."""
+    fmt = request.form.get("format", "pdf")
+    annee = request.form.get("annee")
+    mois_list = request.form.getlist("mois")
+    if "tous" in mois_list:
+        mois_list = [f"{m:02d}" for m in range(1, 13)]
+    if fmt not in ("pdf", "xlsx") or not annee or not mois_list:
+        return jsonify(error="Paramètres invalides"), 400
+    try:
+        periodes = [parse_month(f"{annee}-{m}") for m in mois_list]
+    except ValueError:
+        return jsonify(error="Paramètres invalides"), 400
+    # Refusé ici plutôt qu'en échec dans le processus de la tâche
+    if not all(1 <= a <= 9999 and 1 <= m <= 12 for a, m in periodes):
+        return jsonify(error="Paramètres invalides"), 400
+    conn = db_connect()
+    job_runner = current_app.extensions["job_runner"]
+    ids = [job_runner.submit(conn, "export", {"format": fmt, "annee": f"{a:04d}", "mois": f"{m:02d}"})
+           for a, m in periodes]
+    return jsonify(jobs=[{"id": i, "status_url": url_for("main.job_status", job_id=i)} for i in ids]), 202
+
+@main.route("/jobs/<job_id>")
+@login_required(role="admin")
+def job_status(job_id):
+    job = jobs.get_job(db_connect(), job_id)
+    if job is None:
+        abort(404)
+    return jsonify(id=job["id"], status=job["status"], progress=job["progress"], error=job["error"],
+                   params=job["params"], download_name=job["download_name"],
+                   download_url=url_for("main.job_download", job_id=job_id) if job["status"] == jobs.DONE else None)
+
+@main.route("/jobs/<job_id>/download")
+@login_required(role="admin")
+def job_download(job_id):
+    job = jobs.get_job(db_connect(), job_id)
+    if job is None or job["status"] != jobs.DONE or not os.path.exists(job["result_path"]):
+        abort(404)
+    return send_file(job["result_path"], as_attachment=True, mimetype=job["mimetype"],
+                     download_name=job["download_name"])
+
+@main.cli.command("rebuild-monthly")
+def rebuild_monthly_command():
+    """Reconstruit la synthèse mensuelle presence_monthly depuis presences."""
+    with dbpool.pooled(db_path()) as conn:
+        try:
+            nb = rollup.rebuild(conn)
+        except archives.ArchiveError as e:
+            raise click.ClickException(str(e))
+        conn.commit()
+    print(f"presence_monthly reconstruite : {nb} lignes.")
+
+def _afficher_rapport(rapport):
+    for numero, identifiant, message in rapport.erreurs:
+        print(f"ligne {numero} ({identifiant}) : {message}")
+    print(f"{rapport.lues} lignes lues, {rapport.inserees} enregistrées, {len(rapport.erreurs)} rejetées.")
+
+
+@main.cli.command("import-stagiaires")
+@click.argument("fichier", type=click.Path(exists=True, dir_okay=False))
+def import_stagiaires_command(fichier):
+    """Importe des stagiaires depuis un fichier CSV ou XLSX."""
+    with dbpool.pooled(db_path()) as conn:
+        _afficher_rapport(import_stagiaires(conn, iter_rows(fichier, fichier)))
+
+
+@main.cli.command("import-presences")
+@click.argument("fichier", type=click.Path(exists=True, dir_okay=False))
+def import_presences_command(fichier):
+    """Importe des présences (matricule, date, presence) depuis un CSV ou XLSX."""
+    with dbpool.pooled(db_path()) as conn:
+        _afficher_rapport(import_presences(conn, iter_rows(fichier, fichier)))
+
+@main.cli.command("export-batch")
+@click.option("--debut", required=True, help="Premier mois, AAAA-MM")
+@click.option("--fin", required=True, help="Dernier mois, AAAA-MM")
+@click.option("--bureau", "bureaux", multiple=True, help="Bureau à inclure (répétable)")
+@click.option("--format", "formats", multiple=True, type=click.Choice(["pdf", "xlsx"]), default=["pdf"])
+@click.option("--global", "global_", is_flag=True, help="Un seul document par mois (pas de découpage par bureau)")
+@click.option("-o", "--output", required=True, type=click.Path(dir_okay=False))
+def export_batch_command(debut, fin, bureaux, formats, global_, output):
+    """Génère un ZIP d'états mensuels (par bureau) sur une période."""
+    with open(output, "wb") as f:
+        nb = generate_batch_zip(db_path(), parse_month(debut), parse_month(fin), f, bureaux=list(bureaux) or None,
+                                formats=formats, par_bureau=not global_)
+    print(f"{nb} documents écrits dans {output}.")
+
+@main.cli.command("sync")
+@click.option("--since", default=0, type=int, show_default=True, help="Dernier seq déjà traité")
+@click.option("--limit", default=changelog.MAX_LIMIT, type=int, show_default=True)
+@click.option("--curseur", is_flag=True, help="Affiche seulement le seq courant (point de départ d'une copie)")
+@click.option("--purger-avant", "purger_avant", type=int, metavar="SEQ",
+              help="Supprime les modifications de seq < SEQ (déjà lues par tous les consommateurs)")
+def sync_command(since, limit, curseur, purger_avant):
+    """Écrit en ndjson les modifications postérieures à --since (journal changelog)."""
+    with dbpool.pooled(db_path()) as conn:
+        if purger_avant is not None:
+            click.echo(f"{changelog.purge(conn, purger_avant)} modifications supprimées")
+            return
+        if curseur:
+            click.echo(changelog.current_seq(conn))
+            return
+        try:
+            changelog.check_cursor(conn, since)
+        except changelog.StaleCursor:
+            raise click.ClickException("curseur antérieur au journal conservé : refaire une copie complète")
+        for ligne in changelog.iter_ndjson(conn, since, limit):
+            click.echo(ligne, nl=False)
+
+@main.cli.command("archive")
+@click.option("--annee", required=True, type=int, help="Année close à archiver")
+@click.option("--restaurer", is_flag=True, help="Réintègre l'année dans la base principale")
+def archive_command(annee, restaurer):
+    """Déplace les présences d'une année close dans son fichier d'archive (ou l'y reprend)."""
+    try:
+        if restaurer:
+            click.echo(f"{archives.restore_year(db_path(), annee)} présences de {annee} réintégrées.")
+        else:
+            lignes, chemin = archives.archive_year(db_path(), annee)
+            click.echo(f"{lignes} présences de {annee} archivées dans {chemin}.")
+    except archives.ArchiveError as e:
+        raise click.ClickException(str(e))
+
+@main.cli.command("backup")
+@click.argument("destination", type=click.Path(file_okay=False))
+def backup_command(destination):
+    """Copie à chaud la base et ses archives dans DESTINATION."""
+    for fichier in archives.backup(db_path(), destination):
+        click.echo(fichier)
+
+@main.cli.command("compact")
+def compact_command():
+    """Vide le WAL et récupère la place libérée (VACUUM)."""
+    avant, apres = archives.compact(db_path())
+    click.echo(f"{db_path()} : {avant / 1e6:.1f} Mo -> {apres / 1e6:.1f} Mo")
+
+@main.cli.command("feries")
+@click.option("--annee", "annees", multiple=True, type=int, help="Ajoute les fêtes légales de l'année (répétable)")
+@click.option("--ajouter", nargs=2, metavar="AAAA-MM-JJ LIBELLE", help="Ajoute un jour férié ponctuel (ex. Aïd)")
+@click.option("--supprimer", metavar="AAAA-MM-JJ", help="Retire un jour férié")
+def feries_command(annees, ajouter, supprimer):
+    """Gère la table des jours fériés puis liste ceux de l'année en cours."""
+    with dbpool.pooled(db_path()) as conn:
+        if annees:
+            print(f"{seed_feries(conn, annees)} jours fériés ajoutés.")
+        if ajouter:
+            jour = date.fromisoformat(ajouter[0]).isoformat()
+            conn.execute("INSERT INTO jours_feries (date, libelle) VALUES (?, ?) "
+                         "ON CONFLICT (date) DO UPDATE SET libelle = excluded.libelle", (jour, ajouter[1]))
+        if supprimer:
+            conn.execute("DELETE FROM jours_feries WHERE date = ?", (date.fromisoformat(supprimer).isoformat(),))
+        conn.commit()
+        annee = str(date.today().year)
+        for jour, libelle in conn.execute("SELECT date, libelle FROM jours_feries WHERE substr(date, 1, 4) = ? "
+                                          "ORDER BY date", (annee,)):
+            print(f"{jour}  {libelle}")
+
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,71 @@
+# bench/bench_login.py
+"""
+Connexions par seconde pour un worker, selon la méthode de hachage et le
+nombre de threads (les workers gthread partagent le processus ; le
+hachage libère le GIL).
+
+    python -m bench.bench_login [--connexions 40] [--threads 1 4]
+                                [--methodes scrypt pbkdf2:sha256 pbkdf2:sha256:100000]
+
+Les requêtes passent par le client de test Flask (route /login complète :
+lecture du compte, vérification, session), sans réseau.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+
+def preparer(db_path, nb_comptes, methode):
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM users")
+    # même hachage pour tous les comptes : seule la vérification est mesurée
+    mot_de_passe = generate_password_hash("secret", method=methode)
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, 'admin')",
+                     [(f"compte{i}", mot_de_passe) for i in range(nb_comptes)])
+    conn.commit()
+    conn.close()
+
+
+def mesurer(app, nb_connexions, nb_threads):
+    def connexion(i):
+        client = app.test_client()
+        r = client.post("/login", data={"username": f"compte{i}", "password": "secret"})
+        return r.status_code
+
+    with ThreadPoolExecutor(max_workers=nb_threads) as pool:
+        t0 = time.perf_counter()
+        statuts = list(pool.map(connexion, range(nb_connexions)))
+        duree = time.perf_counter() - t0
+    return nb_connexions / duree, statuts.count(302)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connexions", type=int, default=40)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--methodes", nargs="+", default=["scrypt", "pbkdf2:sha256", "pbkdf2:sha256:100000"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STAGIAIRES_DB"] = os.path.join(tmp, "login.db")
+        os.environ.setdefault("EXPORT_CACHE_DIR", os.path.join(tmp, "exports"))
+        os.environ.setdefault("JOBS_DIR", os.path.join(tmp, "jobs"))
+        from app import app
+        from utils import auth
+
+        print(f"{'méthode':<24} {'threads':>7} {'connexions/s':>13} {'réussies':>9}")
+        for methode in args.methodes:
+            preparer(os.environ["STAGIAIRES_DB"], args.connexions, methode)
+            auth.PASSWORD_HASH_METHOD = methode  # pas de rehachage pendant la mesure
+            for nb_threads in args.threads:
+                debit, reussies = mesurer(app, args.connexions, nb_threads)
+                print(f"{methode:<24} {nb_threads:>7} {debit:>13.1f} {reussies:>6}/{args.connexions}")
+
+
+if __name__ == "__main__":
+    main()
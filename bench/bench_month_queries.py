@@ -0,0 +1,65 @@
+# bench/bench_month_queries.py
+"""
+Compare le filtre historique strftime('%m'/'%Y') et le filtre par
+intervalle de dates, avec et sans l'index idx_presences_date.
+
+    python -m bench.bench_month_queries [nb_stagiaires] [nb_annees]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bench.synth import generate
+
+ANNEE_DEBUT = 2023
+
+REQUETE_STRFTIME = """SELECT stagiaire_id, date, presence FROM presences
+                      WHERE strftime('%m', date) = ? AND strftime('%Y', date) = ?"""
+REQUETE_INTERVALLE = """SELECT stagiaire_id, date, presence FROM presences
+                        WHERE date >= ? AND date < ?"""
+
+
+def chrono(conn, sql, params, repetitions=5):
+    meilleur = float("inf")
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        nb = len(conn.execute(sql, params).fetchall())
+        meilleur = min(meilleur, time.perf_counter() - t0)
+    return meilleur * 1000, nb
+
+
+def mesurer(conn, nom, sql, params):
+    ms, nb = chrono(conn, sql, params)
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()[-1][-1]
+    print(f"{nom:<22} {ms:8.2f} ms  {nb:7d} lignes  [{plan}]")
+
+
+def main():
+    nb_stagiaires = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    nb_annees = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        nb_lignes = generate(db_path, nb_stagiaires=nb_stagiaires, annee_debut=ANNEE_DEBUT, nb_annees=nb_annees)
+        # un mois au milieu de la période générée
+        annee = str(ANNEE_DEBUT + nb_annees // 2)
+        print(f"{nb_stagiaires} stagiaires, {nb_annees} ans, {nb_lignes} présences, mois 04/{annee}")
+        strftime = (REQUETE_STRFTIME, ("04", annee))
+        intervalle = (REQUETE_INTERVALLE, (f"{annee}-04-01", f"{annee}-05-01"))
+
+        conn = sqlite3.connect(db_path)
+        mesurer(conn, "strftime, index", *strftime)
+        mesurer(conn, "intervalle, index", *intervalle)
+        conn.execute("DROP INDEX idx_presences_date")
+        conn.close()
+        # nouvelle connexion : un EXPLAIN mis en cache garderait le plan d'avant le DROP
+        conn = sqlite3.connect(db_path)
+        # strftime sans index : la requête d'origine, avant idx_presences_date
+        mesurer(conn, "strftime, sans index", *strftime)
+        mesurer(conn, "intervalle, sans index", *intervalle)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench/bench_pdf.py
+"""
+Temps de génération et pic mémoire de l'état PDF mensuel selon le nombre
+de stagiaires (grille synthétique en mémoire, sans base de données).
+
+    python -m bench.bench_pdf [nb_stagiaires ...]      (défaut : 100 1000 5000)
+"""
+import re
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from utils.calendrier import weekday_mask
+from utils.export_pdf_officiel import render_etat_presences_pdf
+from utils.grille import MonthGrid
+
+ANNEE, MOIS = 2025, 4
+
+
+def grille_synthetique(nb_stagiaires, seed=42):
+    rng = np.random.default_rng(seed)
+    stagiaires = [(i, f"{i:06d}", f"STAGIAIRE {i:05d}", f"034{i:07d}") for i in range(1, nb_stagiaires + 1)]
+    ouvrables = weekday_mask(ANNEE, MOIS)
+    values = rng.choice(np.array([1.0, 0.5, 0.0], dtype=np.float32), p=[0.85, 0.08, 0.07],
+                        size=(nb_stagiaires, len(ouvrables)))
+    values[:, ~ouvrables] = 0
+    saisi = np.broadcast_to(ouvrables, values.shape).copy()
+    return MonthGrid(ANNEE, MOIS, stagiaires, values, saisi, ouvrables)
+
+
+def mesurer(grid, repetitions):
+    meilleur = float("inf")
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        sortie = render_etat_presences_pdf(grid)
+        meilleur = min(meilleur, time.perf_counter() - t0)
+    # pic mémoire mesuré à part : tracemalloc ralentit le rendu
+    tracemalloc.start()
+    render_etat_presences_pdf(grid)
+    pic = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    donnees = sortie.getvalue()
+    pages = len(re.findall(rb"/Type /Page\b", donnees))
+    return meilleur, pic, len(donnees), pages
+
+
+def main():
+    tailles = [int(a) for a in sys.argv[1:]] or [100, 1000, 5000]
+    print(f"{'stagiaires':>10} {'temps':>10} {'pic mémoire':>12} {'taille':>10} {'pages':>6}")
+    for n in tailles:
+        grid = grille_synthetique(n)
+        duree, pic, taille, pages = mesurer(grid, repetitions=3 if n <= 1000 else 1)
+        print(f"{n:>10} {duree * 1000:>8.0f} ms {pic / 2**20:>9.1f} Mo {taille / 1024:>7.0f} Ko {pages:>6}")
+
+
+if __name__ == "__main__":
+    main()
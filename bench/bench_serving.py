@@ -0,0 +1,127 @@
+# bench/bench_serving.py
+"""
+Comparaison des modes de service sous forte concurrence : gunicorn
+synchrone (Procfile) contre workers à threads (gunicorn_gthread.conf.py).
+
+Chaque client se connecte, puis alterne suivi de son mois
+(/api/v1/me/presences/<mois>) et pointage (/user/presence), comme un
+kiosque ou une application qui interroge le serveur pendant la rafale
+de 8h. Le script démarre lui-même gunicorn sur une base synthétique :
+
+    python -m bench.bench_serving /tmp/service.db --clients 500 --tours 4 --workers 2
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from bench.load_checkin import _connexion, _post
+from bench.synth import METHODE_HASH_TEST, generate
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    "sync": [],
+    "gthread": ["-c", "gunicorn_gthread.conf.py"],
+}
+
+
+def _port_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _demarrer(mode, db_path, workers, dossier):
+    port = _port_libre()
+    # méthode de hachage des comptes synthétiques : pas de rehachage à la connexion
+    env = dict(os.environ, STAGIAIRES_DB=db_path, WEB_CONCURRENCY=str(workers),
+               PASSWORD_HASH_METHOD=METHODE_HASH_TEST,
+               EXPORT_CACHE_DIR=os.path.join(dossier, "exports"), JOBS_DIR=os.path.join(dossier, "jobs"))
+    # -w et -b en ligne de commande priment sur le fichier de configuration
+    serveur = subprocess.Popen([sys.executable, "-m", "gunicorn", *MODES[mode], "-w", str(workers),
+                                "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"],
+                               cwd=RACINE, env=env)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return serveur, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    serveur.kill()
+    raise RuntimeError(f"gunicorn ({mode}) n'a pas démarré")
+
+
+def _get(opener, url):
+    t0 = time.perf_counter()
+    try:
+        with opener.open(url, timeout=60) as r:
+            r.read()
+            statut = r.status
+    except urllib.error.HTTPError as e:
+        statut = e.code
+    except OSError:
+        statut = "erreur"
+    return statut, time.perf_counter() - t0
+
+
+def _client(base_url, opener, tours, mois):
+    mesures = []
+    for _ in range(tours):
+        mesures.append(_get(opener, f"{base_url}/api/v1/me/presences/{mois}"))
+        mesures.append(_post(opener, base_url + "/user/presence", {}))
+    return mesures
+
+
+def mesurer(base_url, nb_clients, tours):
+    mois = date.today().strftime("%Y-%m")
+    matricules = [f"{i:06d}" for i in range(1, nb_clients + 1)]
+    # connexions préalables à concurrence modérée : on mesure le service, pas le hachage
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        openers = list(pool.map(lambda m: _connexion(base_url, m), matricules))
+    with ThreadPoolExecutor(max_workers=nb_clients) as pool:
+        t0 = time.perf_counter()
+        resultats = [m for lot in pool.map(lambda o: _client(base_url, o, tours, mois), openers) for m in lot]
+        duree = time.perf_counter() - t0
+    statuts = {}
+    for statut, _ in resultats:
+        statuts[statut] = statuts.get(statut, 0) + 1
+    latences = sorted(d for _, d in resultats)
+    return {"requetes": len(resultats), "duree": duree, "statuts": statuts,
+            "mediane": statistics.median(latences), "p95": latences[int(len(latences) * 0.95) - 1],
+            "max": latences[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--tours", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    dossier = os.path.dirname(os.path.abspath(args.db))
+    print(f"mode        requêtes   débit      médiane      p95      max   statuts")
+    for mode in args.modes:
+        # base neuve pour chaque mode : mêmes pointages à insérer
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        generate(args.db, nb_stagiaires=args.clients, nb_annees=0, comptes=True)
+        serveur, base_url = _demarrer(mode, args.db, args.workers, dossier)
+        try:
+            r = mesurer(base_url, args.clients, args.tours)
+        finally:
+            serveur.terminate()
+            serveur.wait()
+        print(f"{mode:<10} {r['requetes']:>8} {r['requetes'] / r['duree']:>6.0f}/s "
+              f"{r['mediane'] * 1000:>9.0f} ms {r['p95'] * 1000:>6.0f} ms {r['max'] * 1000:>6.0f} ms   {r['statuts']}")
+
+
+if __name__ == "__main__":
+    main()
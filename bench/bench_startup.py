@@ -0,0 +1,169 @@
+# bench/bench_startup.py
+"""
+Coût de démarrage d'un worker : temps d'import et mémoire.
+
+1) Import de l'application dans des processus neufs (médiane de --essais) :
+   `import app` seul, puis suivi du premier état PDF (import paresseux de
+   ReportLab), comparé à un import qui charge d'emblée les générateurs
+   d'états (comportement d'avant la fabrique create_app).
+2) gunicorn avec --workers workers, sans et avec preload_app : délai
+   jusqu'à la première réponse, puis mémoire du maître et de chaque
+   worker lue dans /proc/<pid>/smaps_rollup (Linux). RSS compte les pages
+   partagées dans chaque processus ; PSS les répartit entre les processus
+   qui les partagent, et sa somme est la mémoire réellement occupée.
+
+    python -m bench.bench_startup /tmp/demarrage.db --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench.bench_serving import RACINE, _port_libre
+from bench.synth import generate
+
+LOURDS = ("flask", "numpy", "reportlab", "xlsxwriter", "openpyxl", "pandas")
+
+# Exécuté dans un processus neuf : une ligne JSON de mesures
+SONDE = """
+import json, sys, time
+t0 = time.perf_counter()
+if {exporteurs}:
+    import utils.export_excel_officiel, utils.export_pdf_officiel
+import app
+t_import = time.perf_counter() - t0
+def rss():
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmRSS")) / 1024
+mesures = {{"import": t_import, "rss": rss(),
+            "modules": sorted({{m.split(".")[0] for m in sys.modules}} & set({lourds}))}}
+if {premier_pdf}:
+    t0 = time.perf_counter()
+    from utils.export_pdf_officiel import generate_etat_presences_pdf
+    generate_etat_presences_pdf(app.app.config["DATABASE"], 1, 2025).close()
+    mesures["premier_pdf"] = time.perf_counter() - t0
+    mesures["rss_pdf"] = rss()
+print(json.dumps(mesures))
+"""
+
+MODES = {
+    "sync": ([], {}),
+    "sync --preload": (["--preload"], {}),
+    "gthread": (["-c", "gunicorn_gthread.conf.py"], {"GUNICORN_PRELOAD": "0"}),
+    "gthread preload": (["-c", "gunicorn_gthread.conf.py"], {"GUNICORN_PRELOAD": "1"}),
+}
+
+
+def _env(db_path, dossier, **extra):
+    return dict(os.environ, STAGIAIRES_DB=db_path, EXPORT_CACHE_DIR=os.path.join(dossier, "exports"),
+                JOBS_DIR=os.path.join(dossier, "jobs"), **extra)
+
+
+def sonder(db_path, dossier, essais, exporteurs=False, premier_pdf=False):
+    code = SONDE.format(exporteurs=exporteurs, premier_pdf=premier_pdf, lourds=LOURDS)
+    resultats = []
+    for _ in range(essais):
+        sortie = subprocess.run([sys.executable, "-c", code], cwd=RACINE, env=_env(db_path, dossier),
+                                capture_output=True, text=True, check=True).stdout
+        resultats.append(json.loads(sortie.splitlines()[-1]))
+    mediane = {cle: statistics.median(r[cle] for r in resultats)
+               for cle in resultats[0] if cle != "modules"}
+    mediane["modules"] = resultats[0]["modules"]
+    return mediane
+
+
+def _enfants(pid):
+    enfants = []
+    for entree in os.listdir("/proc"):
+        if entree.isdigit():
+            try:
+                with open(f"/proc/{entree}/stat") as f:
+                    # le nom du processus (entre parenthèses) peut contenir des espaces
+                    champs = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(champs[1]) == pid:
+                enfants.append(int(entree))
+    return sorted(enfants)
+
+
+def memoire(pid):
+    """{Rss, Pss, Private} en Mo depuis /proc/<pid>/smaps_rollup."""
+    valeurs = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for ligne in f:
+            champs = ligne.split()
+            if len(champs) == 3 and champs[2] == "kB":
+                valeurs[champs[0].rstrip(":")] = int(champs[1]) / 1024
+    return {"Rss": valeurs["Rss"], "Pss": valeurs["Pss"],
+            "Private": valeurs["Private_Clean"] + valeurs["Private_Dirty"]}
+
+
+def servir(mode, db_path, dossier, workers, pause):
+    options, extra = MODES[mode]
+    port = _port_libre()
+    t0 = time.perf_counter()
+    serveur = subprocess.Popen([sys.executable, "-m", "gunicorn", *options, "-w", str(workers),
+                                "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"],
+                               cwd=RACINE, env=_env(db_path, dossier, **extra))
+    try:
+        premiere = None
+        for _ in range(600):
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=5) as r:
+                    r.read()
+                premiere = time.perf_counter() - t0
+                break
+            except OSError:
+                time.sleep(0.05)
+        if premiere is None:
+            raise RuntimeError(f"gunicorn ({mode}) n'a pas démarré")
+        # laisse tous les workers finir de démarrer, puis quelques requêtes sur chacun
+        time.sleep(pause)
+        for _ in range(20 * workers):
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=5) as r:
+                r.read()
+        maitre = memoire(serveur.pid)
+        ouvriers = [memoire(p) for p in _enfants(serveur.pid)]
+        return premiere, maitre, ouvriers
+    finally:
+        serveur.send_signal(signal.SIGTERM)
+        serveur.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db")
+    parser.add_argument("--stagiaires", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--essais", type=int, default=5)
+    parser.add_argument("--pause", type=float, default=3.0, help="secondes entre la première réponse et la mesure")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    dossier = os.path.dirname(os.path.abspath(args.db))
+    if not os.path.exists(args.db):
+        generate(args.db, nb_stagiaires=args.stagiaires, annee_debut=2025, nb_annees=1)
+
+    print("import de l'application       import     RSS   1er PDF  RSS après  modules")
+    for libelle, exporteurs in (("paresseux (create_app)", False), ("générateurs importés d'emblée", True)):
+        r = sonder(args.db, dossier, args.essais, exporteurs=exporteurs, premier_pdf=True)
+        print(f"{libelle:<29} {r['import'] * 1000:>6.0f} ms {r['rss']:>5.1f} Mo {r['premier_pdf'] * 1000:>6.0f} ms "
+              f"{r['rss_pdf']:>6.1f} Mo  {', '.join(r['modules'])}")
+
+    print(f"\n{args.workers} workers            1re réponse  maître RSS   worker RSS   PSS  privé   PSS total")
+    for mode in args.modes:
+        premiere, maitre, ouvriers = servir(mode, args.db, dossier, args.workers, args.pause)
+        moyenne = {cle: statistics.mean(o[cle] for o in ouvriers) for cle in ("Rss", "Pss", "Private")}
+        total = maitre["Pss"] + sum(o["Pss"] for o in ouvriers)
+        print(f"{mode:<18} {premiere * 1000:>9.0f} ms {maitre['Rss']:>9.1f} Mo {moyenne['Rss']:>9.1f} Mo "
+              f"{moyenne['Pss']:>5.1f} {moyenne['Private']:>6.1f} {total:>8.1f} Mo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# bench/bench_suite.py
+"""
+Suite de mesures des chemins critiques (pytest-benchmark), sur une base
+synthétique reproductible (bench/synth.py).
+
+    pip install -r bench/requirements.txt
+    python -m pytest bench/bench_suite.py --benchmark-json=bench-$(git rev-parse --short HEAD).json
+
+Comparer deux commits :
+    python -m pytest bench/bench_suite.py --benchmark-autosave
+    (autre commit) python -m pytest bench/bench_suite.py --benchmark-autosave --benchmark-compare
+
+Taille de la base : BENCH_STAGIAIRES (défaut 500), BENCH_BUREAUX (10),
+BENCH_ANNEES (1). Le fichier n'est pas collecté par un `pytest` lancé à la
+racine (nom hors motif test_*.py) : il faut le désigner explicitement.
+"""
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from bench.synth import METHODE_HASH_TEST, generate
+
+NB_STAGIAIRES = int(os.environ.get("BENCH_STAGIAIRES", "500"))
+NB_BUREAUX = int(os.environ.get("BENCH_BUREAUX", "10"))
+NB_ANNEES = int(os.environ.get("BENCH_ANNEES", "1"))
+ANNEE = 2024
+MOIS = 4
+
+
+@pytest.fixture(scope="module")
+def base(tmp_path_factory):
+    dossier = tmp_path_factory.mktemp("bench")
+    db_path = str(dossier / "bench.db")
+    generate(db_path, nb_stagiaires=NB_STAGIAIRES, nb_bureaux=NB_BUREAUX, annee_debut=ANNEE,
+             nb_annees=NB_ANNEES, comptes=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('admin', ?, 'admin')",
+                 (generate_password_hash("admin", method=METHODE_HASH_TEST),))
+    conn.commit()
+    conn.close()
+    # L'application lit sa configuration à l'import
+    os.environ["STAGIAIRES_DB"] = db_path
+    os.environ["EXPORT_CACHE_DIR"] = str(dossier / "exports")
+    os.environ["JOBS_DIR"] = str(dossier / "jobs")
+    return db_path
+
+
+@pytest.fixture(scope="module")
+def app(base):
+    from app import app as application
+    from utils import auth
+    if application.config["DATABASE"] != base:
+        pytest.skip("app déjà importée avec une autre base")
+    auth.PASSWORD_HASH_METHOD = METHODE_HASH_TEST  # pas de rehachage des comptes de test
+    application.config["TESTING"] = True
+    return application
+
+
+@pytest.fixture(scope="module")
+def admin(app):
+    client = app.test_client()
+    assert client.post("/login", data={"username": "admin", "password": "admin"}).status_code == 302
+    return client
+
+
+@pytest.fixture(scope="module")
+def stagiaire(app):
+    client = app.test_client()
+    assert client.post("/login", data={"username": "000001", "password": "000001"}).status_code == 302
+    return client
+
+
+def test_login(benchmark, app):
+    # comptes hachés avec la méthode légère : mesure de la route, le coût du
+    # hachage selon la méthode est mesuré par bench/bench_login.py
+    client = app.test_client()
+    r = benchmark(client.post, "/login", data={"username": "000002", "password": "000002"})
+    assert r.status_code == 302
+
+
+def test_presences_save(benchmark, admin, base):
+    conn = sqlite3.connect(base)
+    ids = [r[0] for r in conn.execute("SELECT id FROM stagiaire ORDER BY nom_prenoms LIMIT 50")]
+    conn.close()
+    valeurs = ["1", "0.5", "0"]
+    tour = [0]
+
+    def enregistrer():
+        # valeurs différentes à chaque tour : de vraies écritures, pas des lignes inchangées
+        tour[0] += 1
+        donnees = {"date": f"{ANNEE}-{MOIS:02d}-10", "save_presences": "1"}
+        donnees.update({f"presence_{sid}": valeurs[(sid + tour[0]) % 3] for sid in ids})
+        return admin.post("/presences", data=donnees)
+
+    assert benchmark(enregistrer).status_code in (200, 302)
+
+
+def test_recap(benchmark, admin):
+    r = benchmark(admin.post, "/recap", data={"mois": f"{MOIS:02d}", "annee": str(ANNEE)})
+    assert r.status_code == 200
+
+
+def test_presences_admin(benchmark, admin):
+    r = benchmark(admin.get, f"/presences_admin?stagiaire_id=1&month={ANNEE}-{MOIS:02d}")
+    assert r.status_code == 200
+
+
+def test_user_presence(benchmark, stagiaire, base):
+    aujourd_hui = date.today().isoformat()
+
+    def effacer():
+        # chaque tour mesure un vrai pointage (insertion), pas le cas « déjà pointé »
+        conn = sqlite3.connect(base)
+        conn.execute("DELETE FROM presences WHERE stagiaire_id = 1 AND date = ?", (aujourd_hui,))
+        conn.commit()
+        conn.close()
+
+    benchmark.pedantic(stagiaire.post, args=("/user/presence",), setup=effacer, rounds=50)
+
+
+def test_generate_pdf(benchmark, base):
+    from utils.export_pdf_officiel import generate_etat_presences_pdf
+    sortie = benchmark(generate_etat_presences_pdf, base, MOIS, ANNEE)
+    assert sortie.getvalue()[:4] == b"%PDF"
+
+
+def test_generate_excel(benchmark, base):
+    from utils.export_excel_officiel import generate_etat_presences_excel
+
+    def generer():
+        with generate_etat_presences_excel(base, MOIS, ANNEE) as sortie:
+            return sortie.read(4)
+
+    assert benchmark(generer) == b"PK\x03\x04"
+
+
+def test_checkins_batch(benchmark, admin, base):
+    # lot de 200 pointages de borne (bench/kiosque.py mesure le débit de bout en bout)
+    conn = sqlite3.connect(base)
+    matricules = [r[0] for r in conn.execute("SELECT matricule FROM stagiaire ORDER BY matricule LIMIT 200")]
+    conn.close()
+    # la veille : une borne ne peut pas saisir de pointage ancien (pointage.MAX_RETARD)
+    jour = (date.today() - timedelta(days=1)).isoformat()
+    lot = [{"matricule": m, "timestamp": f"{jour}T08:00:00"} for m in matricules]
+
+    def effacer():
+        conn = sqlite3.connect(base)
+        conn.execute("DELETE FROM presences WHERE date = ?", (jour,))
+        conn.commit()
+        conn.close()
+
+    r = benchmark.pedantic(admin.post, args=("/api/v1/checkins",), kwargs={"json": {"checkins": lot}},
+                           setup=effacer, rounds=20)
+    assert r.json["counts"] == {"created": len(lot)}
@@ -0,0 +1,187 @@
+# bench/kiosque.py
+"""
+Borne de pointage de substitution et test de débit de /api/v1/checkins.
+
+1) Préparer une base avec N stagiaires et des comptes de borne
+   (borne01, borne02... ; mot de passe = nom du compte) :
+       python -m bench.kiosque prepare /tmp/kiosque.db --stagiaires 2000 --bornes 4
+2) Lancer le serveur :
+       STAGIAIRES_DB=/tmp/kiosque.db PASSWORD_HASH_METHOD=pbkdf2:sha256:1000 gunicorn -w 2 app:app
+3a) Borne simulée : lit des matricules sur l'entrée standard (un par ligne,
+    comme un lecteur de badges), les garde dans une file locale (fichier
+    JSON lines, qui survit à un redémarrage) et l'envoie par lots :
+       python -m bench.kiosque client http://127.0.0.1:8000 --compte borne01 --file /tmp/borne01.jsonl
+3b) Débit : chaque borne pointe tous les stagiaires de sa part, un lot à la
+    fois, pour plusieurs tailles de lot (1 = un pointage par requête) :
+       python -m bench.kiosque run http://127.0.0.1:8000 --stagiaires 2000 --bornes 4 --lots 1 50 200 500
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from bench.load_checkin import _connexion
+from bench.synth import METHODE_HASH_TEST, generate
+
+
+def prepare(db_path, nb_stagiaires, nb_bornes):
+    generate(db_path, nb_stagiaires=nb_stagiaires, nb_annees=0)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, 'kiosque')",
+                     [(c, generate_password_hash(c, method=METHODE_HASH_TEST)) for c in _comptes(nb_bornes)])
+    conn.commit()
+    conn.close()
+    print(f"{nb_stagiaires} stagiaires et {nb_bornes} bornes prêts dans {db_path}")
+
+
+def _comptes(nb_bornes):
+    return [f"borne{i:02d}" for i in range(1, nb_bornes + 1)]
+
+
+def envoyer(opener, base_url, lot):
+    """POST d'un lot ; retourne la réponse JSON (lève OSError en cas d'échec)."""
+    requete = urllib.request.Request(base_url + "/api/v1/checkins", json.dumps({"checkins": lot}).encode(),
+                                     {"Content-Type": "application/json"})
+    with opener.open(requete, timeout=60) as r:
+        return json.load(r)
+
+
+# ---------------- Borne simulée ----------------
+class FileLocale:
+    """File de pointages persistée en JSON lines (ajout en fin, retrait en tête)."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._lock = threading.Lock()
+        open(chemin, "a").close()
+
+    def ajouter(self, pointage):
+        with self._lock, open(self.chemin, "a", encoding="utf-8") as f:
+            f.write(json.dumps(pointage) + "\n")
+
+    def tete(self, n):
+        with self._lock, open(self.chemin, encoding="utf-8") as f:
+            return [json.loads(l) for _, l in zip(range(n), f)]
+
+    def retirer(self, n):
+        with self._lock:
+            with open(self.chemin, encoding="utf-8") as f:
+                reste = f.readlines()[n:]
+            with open(self.chemin + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(reste)
+            os.replace(self.chemin + ".tmp", self.chemin)
+
+    def __len__(self):
+        with self._lock, open(self.chemin, encoding="utf-8") as f:
+            return sum(1 for _ in f)
+
+
+def client(base_url, compte, chemin, lot_max, periode):
+    base_url = base_url.rstrip("/")
+    file = FileLocale(chemin)
+    opener = _connexion(base_url, compte)
+    arret = threading.Event()
+
+    def vider():
+        attente = periode
+        while not arret.is_set() or len(file):
+            lot = file.tete(lot_max)
+            if not lot:
+                arret.wait(periode)
+                continue
+            try:
+                reponse = envoyer(opener, base_url, lot)
+            except OSError as e:
+                print(f"envoi impossible ({e}), {len(file)} en attente", file=sys.stderr)
+                if arret.is_set():
+                    return
+                arret.wait(attente)
+                attente = min(attente * 2, 60)
+                continue
+            attente = periode
+            file.retirer(len(lot))
+            for p, statut in zip(lot, reponse["results"]):
+                print(f"{p['timestamp']} {p['matricule']} {statut}")
+
+    envoi = threading.Thread(target=vider)
+    envoi.start()
+    try:
+        for ligne in sys.stdin:
+            if ligne.strip():
+                file.ajouter({"matricule": ligne.strip(), "timestamp": datetime.now().isoformat(timespec="seconds")})
+    finally:
+        arret.set()
+        envoi.join()
+
+
+# ---------------- Débit ----------------
+def run(base_url, nb_stagiaires, nb_bornes, lots):
+    base_url = base_url.rstrip("/")
+    matricules = [f"{i:06d}" for i in range(1, nb_stagiaires + 1)]
+    openers = [_connexion(base_url, c) for c in _comptes(nb_bornes)]
+    print("   lot  pointages   durée      débit   requêtes  statuts")
+    for n, taille in enumerate(lots):
+        # un jour différent par taille de lot : chaque mesure insère vraiment ses pointages
+        jour = date.today() - timedelta(days=n + 1)
+        pointages = [{"matricule": m, "timestamp": f"{jour.isoformat()}T08:{i % 60:02d}:00"}
+                     for i, m in enumerate(matricules)]
+        parts = [pointages[b::nb_bornes] for b in range(nb_bornes)]
+
+        def borne(b):
+            statuts = {}
+            requetes = 0
+            for i in range(0, len(parts[b]), taille):
+                for statut in envoyer(openers[b], base_url, parts[b][i:i + taille])["results"]:
+                    statuts[statut] = statuts.get(statut, 0) + 1
+                requetes += 1
+            return statuts, requetes
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=nb_bornes) as pool:
+            resultats = list(pool.map(borne, range(nb_bornes)))
+        duree = time.perf_counter() - t0
+        statuts = {}
+        for s, _ in resultats:
+            for k, v in s.items():
+                statuts[k] = statuts.get(k, 0) + v
+        print(f"{taille:>6} {len(pointages):>10} {duree:>6.2f} s {len(pointages) / duree:>8.0f}/s "
+              f"{sum(r for _, r in resultats):>9}  {statuts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sous = parser.add_subparsers(dest="commande", required=True)
+    p = sous.add_parser("prepare")
+    p.add_argument("db")
+    p.add_argument("--stagiaires", type=int, default=2000)
+    p.add_argument("--bornes", type=int, default=4)
+    c = sous.add_parser("client")
+    c.add_argument("url")
+    c.add_argument("--compte", default="borne01")
+    c.add_argument("--file", default="borne.jsonl", help="file locale des pointages non envoyés")
+    c.add_argument("--lot", type=int, default=200)
+    c.add_argument("--periode", type=float, default=2.0, help="secondes entre deux envois")
+    r = sous.add_parser("run")
+    r.add_argument("url")
+    r.add_argument("--stagiaires", type=int, default=2000)
+    r.add_argument("--bornes", type=int, default=4)
+    r.add_argument("--lots", type=int, nargs="+", default=[1, 50, 200, 500])
+    args = parser.parse_args()
+    if args.commande == "prepare":
+        prepare(args.db, args.stagiaires, args.bornes)
+    elif args.commande == "client":
+        client(args.url, args.compte, args.file, args.lot, args.periode)
+    else:
+        run(args.url, args.stagiaires, args.bornes, args.lots)
+
+
+if __name__ == "__main__":
+    main()
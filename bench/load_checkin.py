@@ -0,0 +1,99 @@
+# bench/load_checkin.py
+"""
+Test de charge du pointage /user/presence (rafale de 8h).
+
+1) Préparer une base avec N stagiaires et leurs comptes (mot de passe = matricule) :
+       python -m bench.load_checkin prepare /tmp/charge.db --stagiaires 500
+2) Lancer le serveur sur cette base :
+       STAGIAIRES_DB=/tmp/charge.db gunicorn -w 4 app:app
+3) Simuler les pointages simultanés (chaque client se connecte puis pointe
+   deux fois, comme un double clic) :
+       python -m bench.load_checkin run http://127.0.0.1:8000 --stagiaires 500 --concurrence 200
+"""
+import argparse
+import http.cookiejar
+import statistics
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.synth import generate
+
+
+def prepare(db_path, nb_stagiaires):
+    # Hachage volontairement léger des comptes : on mesure le pointage, pas la connexion
+    generate(db_path, nb_stagiaires=nb_stagiaires, nb_annees=0, comptes=True)
+    print(f"{nb_stagiaires} comptes prêts dans {db_path}")
+
+
+class _SansRedirection(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _connexion(base_url, matricule):
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SansRedirection())
+    _post(opener, base_url + "/login", {"username": matricule, "password": matricule})
+    return opener
+
+
+def _post(opener, url, donnees):
+    corps = urllib.parse.urlencode(donnees).encode()
+    t0 = time.perf_counter()
+    try:
+        statut = opener.open(url, corps, timeout=30).status
+    except urllib.error.HTTPError as e:
+        statut = e.code
+    except OSError:
+        statut = "erreur"
+    return statut, time.perf_counter() - t0
+
+
+def _pointer(base_url, opener):
+    # deux envois coup sur coup, comme un double clic
+    return [_post(opener, base_url + "/user/presence", {}) for _ in range(2)]
+
+
+def run(base_url, nb_stagiaires, concurrence):
+    base_url = base_url.rstrip("/")
+    matricules = [f"{i:06d}" for i in range(1, nb_stagiaires + 1)]
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        # 1) tout le monde se connecte ; 2) tout le monde pointe en même temps
+        openers = list(pool.map(lambda m: _connexion(base_url, m), matricules))
+        t0 = time.perf_counter()
+        resultats = [m for lot in pool.map(lambda o: _pointer(base_url, o), openers) for m in lot]
+        duree = time.perf_counter() - t0
+
+    statuts = {}
+    for statut, _ in resultats:
+        statuts[statut] = statuts.get(statut, 0) + 1
+    latences = sorted(d for _, d in resultats)
+    print(f"{len(resultats)} pointages en {duree:.2f} s ({len(resultats) / duree:.0f}/s)")
+    print(f"statuts : {statuts}")
+    if latences:
+        print(f"latence médiane {statistics.median(latences) * 1000:.1f} ms, "
+              f"p95 {latences[int(len(latences) * 0.95) - 1] * 1000:.1f} ms, max {latences[-1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sous = parser.add_subparsers(dest="commande", required=True)
+    p = sous.add_parser("prepare")
+    p.add_argument("db")
+    p.add_argument("--stagiaires", type=int, default=500)
+    r = sous.add_parser("run")
+    r.add_argument("url")
+    r.add_argument("--stagiaires", type=int, default=500)
+    r.add_argument("--concurrence", type=int, default=200)
+    args = parser.parse_args()
+    if args.commande == "prepare":
+        prepare(args.db, args.stagiaires)
+    else:
+        run(args.url, args.stagiaires, args.concurrence)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# bench/synth.py
+"""
+Génération d'une base synthétique pour les mesures de performance :
+N stagiaires répartis sur M bureaux, Y années de présences.
+
+Les données sont reproductibles (graine fixe) et proches du réel : chaque
+stagiaire a sa propre assiduité (présences, demi-journées, absences),
+les week-ends et jours fériés malgaches sont chômés, les présences
+pleines portent une heure de pointage.
+
+    python -m bench.synth /tmp/bench.db --stagiaires 2000 --bureaux 20 --annees 3 [--comptes]
+"""
+import argparse
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from utils.calendrier import feries_malgaches
+from utils.migrations import upgrade
+
+NOMS = ["RAKOTO", "RASOA", "RABE", "RANDRIA", "RAZAFY", "RAHARISON", "RAVELO", "RANAIVO",
+        "ANDRIAMAHEFA", "RAKOTONIRINA", "RAZANAMPARANY", "RANDRIANARISOA", "RAMANANTSOA", "RAJAONA"]
+PRENOMS = ["Fitahiana", "Hery", "Tiana", "Miora", "Faniry", "Mamy", "Voahirana", "Tsiry", "Hanitra",
+           "Njaka", "Lova", "Sitraka", "Mialy", "Toky", "Ando", "Fanja", "Rindra", "Onja"]
+BUREAUX = ["TANA RP", "TANA CCP", "AMBANIDIA", "ANALAKELY", "ANKORONDRANO", "ISOTRY", "67 HA",
+           "AMPEFILOHA", "ANDRAVOAHANGY", "BEHORIRIKA", "ITAOSY", "IVATO"]
+
+# Hachage volontairement léger pour les comptes de test (mot de passe = matricule)
+METHODE_HASH_TEST = "pbkdf2:sha256:1000"
+
+
+def working_days(annee_debut, nb_annees):
+    jour = date(annee_debut, 1, 1)
+    fin = date(annee_debut + nb_annees, 1, 1)
+    feries = {d for annee in range(annee_debut, annee_debut + nb_annees) for d, _ in feries_malgaches(annee)}
+    while jour < fin:
+        if jour.weekday() < 5 and jour not in feries:
+            yield jour.isoformat()
+        jour += timedelta(days=1)
+
+
+def nom_bureau(i):
+    return BUREAUX[i] if i < len(BUREAUX) else f"BUREAU {i:02d}"
+
+
+def generate(db_path, nb_stagiaires=2000, nb_bureaux=20, annee_debut=2023, nb_annees=3, seed=42,
+             comptes=False):
+    """
+    Crée `nb_stagiaires` stagiaires et leurs présences sur `nb_annees` années.
+    Avec `comptes`, crée aussi un compte utilisateur par stagiaire
+    (identifiant et mot de passe = matricule). Retourne le nombre de présences.
+    """
+    rng = random.Random(seed)
+    upgrade(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO stagiaire (nom_prenoms, paositra_money, bureau, matricule) VALUES (?, ?, ?, ?)",
+        ((f"{rng.choice(NOMS)} {rng.choice(PRENOMS)} {rng.choice(PRENOMS)}", f"034{i:07d}",
+          nom_bureau(i % nb_bureaux), f"{i:06d}")
+         for i in range(1, nb_stagiaires + 1)))
+    stagiaires = conn.execute("SELECT id, matricule FROM stagiaire").fetchall()
+    if comptes:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password, role, matricule) VALUES (?, ?, 'user', ?)",
+            [(m, generate_password_hash(m, method=METHODE_HASH_TEST), m) for _, m in stagiaires])
+
+    # Assiduité propre à chaque stagiaire : seuils cumulés (présent, demi-journée, absent)
+    profils = {}
+    for sid, _ in stagiaires:
+        present = rng.uniform(0.70, 0.95)
+        demi = rng.uniform(0.02, 0.10)
+        absent = rng.uniform(0.01, 0.06)
+        profils[sid] = (present, present + demi, present + demi + absent)
+
+    def lignes():
+        for jour in working_days(annee_debut, nb_annees):
+            for sid, _ in stagiaires:
+                present, demi, absent = profils[sid]
+                tirage = rng.random()
+                if tirage < present:
+                    minutes = 7 * 60 + 15 + int(rng.gauss(30, 12))
+                    yield sid, jour, 1.0, f"{minutes // 60:02d}:{minutes % 60:02d}:{rng.randrange(60):02d}"
+                elif tirage < demi:
+                    yield sid, jour, 0.5, None
+                elif tirage < absent:
+                    yield sid, jour, 0.0, None
+                # sinon : jour non saisi
+
+    conn.executemany("INSERT INTO presences (stagiaire_id, date, presence, time) VALUES (?, ?, ?, ?)", lignes())
+    conn.commit()
+    conn.execute("ANALYZE")
+    nb = conn.execute("SELECT COUNT(*) FROM presences").fetchone()[0]
+    conn.close()
+    return nb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db")
+    parser.add_argument("--stagiaires", type=int, default=2000)
+    parser.add_argument("--bureaux", type=int, default=20)
+    parser.add_argument("--debut", type=int, default=2023, help="première année")
+    parser.add_argument("--annees", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--comptes", action="store_true", help="un compte utilisateur par stagiaire")
+    args = parser.parse_args()
+    nb = generate(args.db, nb_stagiaires=args.stagiaires, nb_bureaux=args.bureaux, annee_debut=args.debut,
+                  nb_annees=args.annees, seed=args.seed, comptes=args.comptes)
+    print(f"{args.stagiaires} stagiaires, {args.bureaux} bureaux, {args.annees} an(s) : {nb} présences dans {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# gunicorn_gthread.conf.py
+"""
+Mode à threads pour les pics de connexions (pointage de 8h, suivi des
+exports, kiosques) :
+
+    gunicorn -c gunicorn_gthread.conf.py app:app
+
+Chaque worker sert GUNICORN_THREADS requêtes à la fois. SQLite et le
+hachage des mots de passe libèrent le GIL, donc pointages et lectures
+avancent en parallèle. Les rendus PDF / Excel passent par un pool borné
+(RENDER_THREADS, utils/offload.py) pour ne pas accaparer le worker.
+
+L'application est chargée une seule fois dans le maître (preload_app,
+GUNICORN_PRELOAD=0 pour revenir au chargement par worker) : les workers
+forkés partagent ses pages mémoire en copie sur écriture et démarrent
+sans réimporter Flask, numpy ni les générateurs d'états. Contrepartie :
+un HUP ne recharge plus le code, redémarrer le maître après un déploiement.
+
+Le Procfile garde le mode synchrone historique (gunicorn app:app).
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Peu de processus (une écriture SQLite à la fois de toute façon), beaucoup de threads
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+# Connexions keep-alive gardées ouvertes par worker, file d'attente du socket
+worker_connections = 1000
+backlog = 2048
+keepalive = 5
+# Un rendu d'état volumineux peut dépasser les 30 s par défaut
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# Une connexion SQLite par thread actif, réutilisée d'une requête à l'autre
+os.environ.setdefault("SQLITE_POOL_SIZE", str(threads))
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def on_starting(server):
+    # Appelé dans le maître, après le chargement de l'application (preload_app)
+    if not preload_app:
+        return
+    # Générateurs PDF / Excel (ReportLab, xlsxwriter) importés une fois pour tous les workers
+    import utils.export_excel_officiel  # noqa: F401
+    import utils.export_pdf_officiel  # noqa: F401
+    # Objets déjà créés sortis du ramasse-miettes : le parcourir ne recopie pas leurs pages dans chaque worker
+    gc.freeze()
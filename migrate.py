@@ -0,0 +1,10 @@
+# migrate.py
+# Met à jour le schéma de la base : python migrate.py [chemin_db]
+import os
+import sys
+
+from utils.migrations import upgrade
+
+DB = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("STAGIAIRES_DB", "stagiaires.db")
+version = upgrade(DB, verbose=True)
+print(f"Base {DB} à la version {version}.")
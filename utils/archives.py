@@ -0,0 +1,343 @@
+# utils/archives.py
+"""
+Archivage annuel des présences, sauvegarde et compactage.
+
+- `flask archive --annee 2023` déplace les présences d'une année close
+  dans archives/presences_2023.db (ARCHIVE_DIR, par défaut à côté de la
+  base). La synthèse mensuelle presence_monthly reste dans la base
+  principale : /recap ne voit aucune différence.
+- Les lectures passent par `presences_source(conn, debut, fin)`, qui
+  n'attache (ATTACH) le fichier d'une année archivée que si la période
+  demandée la recouvre ; les années courantes restent servies par la
+  seule table presences.
+- Une année archivée est en lecture seule : des triggers refusent toute
+  écriture de présence datée de cette année.
+- L'archivage n'est pas une modification des données : il ne fait pas
+  apparaître de suppressions dans le journal changelog.
+
+`flask backup DOSSIER` copie la base et les archives à chaud (API de
+sauvegarde SQLite) ; `flask compact` récupère la place libérée (VACUUM).
+"""
+import os
+import sqlite3
+from datetime import date, datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    annee INTEGER PRIMARY KEY,
+    fichier TEXT NOT NULL,          -- nom du fichier dans le dossier des archives
+    lignes INTEGER NOT NULL,
+    archived_at TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_archive_insert
+BEFORE INSERT ON presences
+WHEN EXISTS (SELECT 1 FROM archives WHERE annee = CAST(substr(NEW.date, 1, 4) AS INTEGER))
+BEGIN
+    SELECT RAISE(ABORT, 'année archivée : présences en lecture seule');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_archive_update
+BEFORE UPDATE ON presences
+WHEN EXISTS (SELECT 1 FROM archives WHERE annee = CAST(substr(NEW.date, 1, 4) AS INTEGER))
+BEGIN
+    SELECT RAISE(ABORT, 'année archivée : présences en lecture seule');
+END;
+"""
+
+# Schéma d'un fichier d'archive (une année)
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS presences (
+    stagiaire_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    presence REAL NOT NULL,
+    time TEXT,
+    PRIMARY KEY (stagiaire_id, date)
+);
+CREATE INDEX IF NOT EXISTS idx_presences_date ON presences (date, stagiaire_id);
+CREATE TABLE IF NOT EXISTS presence_monthly (
+    stagiaire_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,
+    total_days REAL NOT NULL DEFAULT 0,
+    half_days INTEGER NOT NULL DEFAULT 0,
+    absent_days INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (year_month, stagiaire_id)
+) WITHOUT ROWID;
+"""
+
+COLONNES = "stagiaire_id, date, presence, time"
+# Archives attachées au plus par connexion (SQLite en accepte 10 par défaut)
+MAX_ATTACHED = 8
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir(db_path):
+    return os.environ.get("ARCHIVE_DIR") or os.path.join(os.path.dirname(os.path.abspath(db_path)), "archives")
+
+
+def _main_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def _bornes(annee):
+    return f"{annee:04d}-01-01", f"{annee + 1:04d}-01-01"
+
+
+def archived_years(conn):
+    """{annee: fichier} des années archivées ({} avant la migration)."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archives'").fetchone() is None:
+        return {}
+    return dict(conn.execute("SELECT annee, fichier FROM archives"))
+
+
+def is_archived(conn, jour):
+    """Vrai si la date 'AAAA-MM-JJ' appartient à une année archivée."""
+    try:
+        return int(str(jour)[:4]) in archived_years(conn)
+    except ValueError:
+        return False
+
+
+def _attach(conn, fichiers):
+    """
+    Attache à la connexion les archives {annee: fichier} (celles déjà
+    attachées sont réutilisées) ; retourne leurs noms de schéma. Pour faire
+    de la place, seules des archives dont cet appel n'a pas besoin sont
+    détachées.
+    """
+    noms = {f"archive_{annee:04d}": fichier for annee, fichier in sorted(fichiers.items())}
+    if len(noms) > MAX_ATTACHED:
+        raise ArchiveError(f"{len(noms)} années archivées concernées, au plus {MAX_ATTACHED} à la fois : "
+                           "réduire la période ou restaurer des années")
+    attachees = [r[1] for r in conn.execute("PRAGMA database_list") if r[1].startswith("archive_")]
+    manquantes = [n for n in noms if n not in attachees]
+    if not manquantes:
+        return list(noms)
+    if conn.in_transaction:
+        # ATTACH / DETACH impossibles dans une transaction
+        raise ArchiveError(f"archives {', '.join(manquantes)} à attacher hors transaction")
+    inutiles = [n for n in attachees if n not in noms]
+    for ancien in inutiles[:max(0, len(attachees) + len(manquantes) - MAX_ATTACHED)]:
+        conn.execute(f"DETACH DATABASE {ancien}")
+    dossier = archive_dir(_main_path(conn))
+    for nom in manquantes:
+        chemin = os.path.join(dossier, noms[nom])
+        if not os.path.exists(chemin):
+            raise ArchiveError(f"archive {nom[len('archive_'):]} introuvable : {chemin}")
+        conn.execute(f"ATTACH DATABASE ? AS {nom}", (chemin,))
+    return list(noms)
+
+
+def _annee(borne):
+    try:
+        return int(borne[:4]) if borne else None
+    except ValueError:
+        return None
+
+
+def presences_source(conn, debut=None, fin=None):
+    """
+    Expression de table (pour FROM / JOIN) couvrant les présences de
+    [debut, fin[ ('AAAA-MM-JJ', None = sans borne) : `presences` si aucune
+    année archivée n'est concernée, sinon la table de l'archive, ou une
+    UNION ALL des archives et de la table courante. Colonnes garanties :
+    stagiaire_id, date, presence, time. Lève ArchiveError si la période
+    couvre plus de MAX_ATTACHED années archivées.
+    """
+    annees = archived_years(conn)
+    if not annees:
+        return "presences"
+    premiere = _annee(debut)
+    derniere = _annee(fin)
+    if derniere is not None and fin[5:] == "01-01":
+        derniere -= 1
+    concernees = sorted(a for a in annees
+                        if (premiere is None or a >= premiere) and (derniere is None or a <= derniere))
+    if not concernees:
+        return "presences"
+    schemas = _attach(conn, {a: annees[a] for a in concernees})
+    toutes_archivees = premiere is not None and derniere is not None and \
+        all(a in annees for a in range(premiere, derniere + 1))
+    if toutes_archivees and len(schemas) == 1:
+        return f"{schemas[0]}.presences"
+    parties = [f"SELECT {COLONNES} FROM {s}.presences" for s in schemas]
+    if not toutes_archivees:
+        parties.append(f"SELECT {COLONNES} FROM main.presences")
+    return "(" + " UNION ALL ".join(parties) + ")"
+
+
+# ---------------- Archivage ----------------
+def _sequence_changelog(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changelog'").fetchone()
+    return row[0] if row else None
+
+
+def _effacer_journal(conn, sequence):
+    # Les triggers ont journalisé le déplacement comme des modifications : on les retire
+    if sequence is None:
+        conn.execute("DELETE FROM changelog")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'changelog'")
+    else:
+        conn.execute("DELETE FROM changelog WHERE seq > ?", (sequence,))
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'changelog'", (sequence,))
+
+
+def archive_year(db_path, annee):
+    """
+    Déplace les présences de `annee` (année close) dans son fichier
+    d'archive. Retourne (lignes déplacées, chemin de l'archive).
+
+    1) copie dans l'archive, validée à part (le fichier est durable avant
+       toute suppression) ;
+    2) dans une transaction de la base : enregistrement de l'année,
+       suppression des lignes copiées, synthèse mensuelle remise en état.
+    Si des présences de l'année ont changé entre les deux, rien n'est
+    supprimé : relancer la commande.
+    """
+    annee = int(annee)
+    if annee >= date.today().year:
+        raise ArchiveError(f"{annee} n'est pas une année close")
+    dossier = archive_dir(db_path)
+    os.makedirs(dossier, exist_ok=True)
+    fichier = f"presences_{annee:04d}.db"
+    chemin = os.path.join(dossier, fichier)
+    debut, fin = _bornes(annee)
+
+    archive = sqlite3.connect(chemin)
+    archive.executescript(ARCHIVE_SCHEMA)
+    archive.close()
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        if annee in archived_years(conn):
+            raise ArchiveError(f"{annee} est déjà archivée ({fichier})")
+        conn.execute("ATTACH DATABASE ? AS destination", (chemin,))
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Fichier laissé par une restauration : repart de l'état courant de la base
+            conn.execute("DELETE FROM destination.presences")
+            conn.execute("DELETE FROM destination.presence_monthly")
+            conn.execute(f"""INSERT INTO destination.presences ({COLONNES})
+                             SELECT {COLONNES} FROM main.presences WHERE date >= ? AND date < ?""", (debut, fin))
+            conn.execute("""INSERT INTO destination.presence_monthly
+                            SELECT stagiaire_id, year_month, total_days, half_days, absent_days
+                            FROM main.presence_monthly WHERE year_month >= ? AND year_month < ?""",
+                         (debut[:7], fin[:7]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            differentes = conn.execute("""
+                SELECT COUNT(*) FROM main.presences p
+                WHERE p.date >= ? AND p.date < ? AND NOT EXISTS (
+                    SELECT 1 FROM destination.presences d
+                    WHERE d.stagiaire_id = p.stagiaire_id AND d.date = p.date
+                      AND d.presence IS p.presence AND d.time IS p.time)""", (debut, fin)).fetchone()[0]
+            differentes += conn.execute("""
+                SELECT COUNT(*) FROM destination.presences d WHERE NOT EXISTS (
+                    SELECT 1 FROM main.presences p WHERE p.stagiaire_id = d.stagiaire_id AND p.date = d.date)
+            """).fetchone()[0]
+            if differentes:
+                raise ArchiveError(f"{differentes} présences de {annee} modifiées pendant la copie : relancer")
+            sequence = _sequence_changelog(conn)
+            conn.execute("""CREATE TEMP TABLE synthese_archivee AS SELECT * FROM main.presence_monthly
+                            WHERE year_month >= ? AND year_month < ?""", (debut[:7], fin[:7]))
+            lignes = conn.execute("DELETE FROM main.presences WHERE date >= ? AND date < ?", (debut, fin)).rowcount
+            conn.execute("INSERT INTO archives (annee, fichier, lignes, archived_at) VALUES (?, ?, ?, ?)",
+                         (annee, fichier, lignes, datetime.now(timezone.utc).isoformat(timespec="seconds")))
+            # Les triggers de synthèse ont décompté les lignes supprimées : on rétablit les totaux
+            conn.execute("INSERT OR REPLACE INTO main.presence_monthly SELECT * FROM temp.synthese_archivee")
+            conn.execute("DROP TABLE temp.synthese_archivee")
+            _effacer_journal(conn, sequence)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DETACH DATABASE destination")
+        return lignes, chemin
+    finally:
+        conn.close()
+
+
+def restore_year(db_path, annee):
+    """Réintègre une année archivée dans la base principale. Retourne le nombre de lignes."""
+    annee = int(annee)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        annees = archived_years(conn)
+        if annee not in annees:
+            raise ArchiveError(f"{annee} n'est pas archivée")
+        schema = _attach(conn, {annee: annees[annee]})[0]
+        debut, fin = _bornes(annee)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sequence = _sequence_changelog(conn)
+            conn.execute("DELETE FROM archives WHERE annee = ?", (annee,))
+            # Synthèse reconstruite par les triggers au fil des insertions
+            conn.execute("DELETE FROM main.presence_monthly WHERE year_month >= ? AND year_month < ?",
+                         (debut[:7], fin[:7]))
+            lignes = conn.execute(f"INSERT INTO main.presences ({COLONNES}) SELECT {COLONNES} FROM {schema}.presences"
+                                  ).rowcount
+            _effacer_journal(conn, sequence)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute(f"DETACH DATABASE {schema}")
+        return lignes
+    finally:
+        conn.close()
+
+
+# ---------------- Sauvegarde et compactage ----------------
+def backup(db_path, destination):
+    """
+    Copie cohérente de la base et des archives dans `destination`, sans
+    arrêter l'application (API de sauvegarde SQLite). Retourne les fichiers écrits.
+    """
+    os.makedirs(destination, exist_ok=True)
+    copies = [(db_path, os.path.join(destination, os.path.basename(db_path)))]
+    dossier = archive_dir(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        fichiers = sorted(archived_years(conn).values())
+    finally:
+        conn.close()
+    if fichiers:
+        os.makedirs(os.path.join(destination, "archives"), exist_ok=True)
+        copies += [(os.path.join(dossier, f), os.path.join(destination, "archives", f)) for f in fichiers]
+    for source, cible in copies:
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(cible)
+        try:
+            # En WAL, une passe unique lit un instantané sans bloquer les écritures
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    return [cible for _, cible in copies]
+
+
+def _taille(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def compact(db_path):
+    """Vide le WAL et reconstruit la base (VACUUM). Retourne (taille avant, taille après) en octets."""
+    avant = _taille(db_path)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return avant, _taille(db_path)
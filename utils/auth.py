@@ -0,0 +1,102 @@
+# utils/auth.py
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+from flask import flash, jsonify, redirect, session, url_for
+from werkzeug.security import generate_password_hash
+
+# Méthode de hachage des nouveaux mots de passe (format werkzeug, ex. "scrypt",
+# "pbkdf2:sha256:600000"). Les anciens hachages sont convertis à la connexion.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+# Vérifications de mot de passe simultanées par worker, et attente maximale
+# (secondes) d'une place avant de répondre 503
+LOGIN_CONCURRENCY = int(os.environ.get("LOGIN_CONCURRENCY", str(os.cpu_count() or 1)))
+LOGIN_QUEUE_TIMEOUT = float(os.environ.get("LOGIN_QUEUE_TIMEOUT", "5"))
+
+
+def _roles(role):
+    # un rôle ("admin") ou plusieurs (("admin", "kiosque"))
+    return (role,) if isinstance(role, str) else role
+
+
+def login_required(role=None):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if "user_id" not in session:
+                flash("Veuillez vous connecter.", "warning")
+                return redirect(url_for("main.login"))
+            if role and session.get("role") not in _roles(role):
+                flash("Accès refusé.", "danger")
+                # redirection selon rôle
+                if session.get("role") == "user":
+                    return redirect(url_for("main.user_profile"))
+                if session.get("role") == "kiosque":
+                    return redirect(url_for("main.kiosque"))
+                return redirect(url_for("main.index"))
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def api_login_required(role=None):
+    """Variante pour l'API JSON : 401/403 au lieu d'une redirection."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if "user_id" not in session:
+                return jsonify(error="Authentification requise"), 401
+            if role and session.get("role") not in _roles(role):
+                return jsonify(error="Accès refusé"), 403
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------- Mots de passe ----------------
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or PASSWORD_HASH_METHOD)
+
+
+@lru_cache(maxsize=None)
+def _prefixe(method):
+    # Paramètres complets tels que werkzeug les écrit ("scrypt" -> "scrypt:32768:8:1")
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def needs_rehash(stored, method=None):
+    """Vrai si `stored` n'a pas été haché avec la méthode configurée."""
+    return stored.split("$", 1)[0] != _prefixe(method or PASSWORD_HASH_METHOD)
+
+
+class LoginBusy(Exception):
+    """Aucune place libérée à temps pour vérifier un mot de passe."""
+
+
+class LoginLimiter:
+    """
+    File d'attente bornée des vérifications de mot de passe (une par worker).
+    Le hachage libère le GIL : avec des workers à threads, `concurrency`
+    vérifications tournent en parallèle, les suivantes attendent au plus
+    `timeout` secondes puis sont refusées (LoginBusy) au lieu d'accumuler
+    des requêtes qui expireraient de toute façon.
+    """
+
+    def __init__(self, concurrency=LOGIN_CONCURRENCY, timeout=LOGIN_QUEUE_TIMEOUT):
+        self.timeout = timeout
+        self._places = threading.BoundedSemaphore(max(1, concurrency))
+        self._verrou = threading.Lock()
+        self.refusees = 0
+
+    @contextmanager
+    def slot(self):
+        if not self._places.acquire(timeout=self.timeout):
+            with self._verrou:
+                self.refusees += 1
+            raise LoginBusy()
+        try:
+            yield
+        finally:
+            self._places.release()
@@ -0,0 +1,170 @@
+# utils/calendrier.py
+"""
+Outils de calendrier : bornes de mois, jours ouvrables et jours fériés.
+
+Les jours fériés sont stockés dans la table `jours_feries` (fêtes légales
+malgaches pré-remplies, complétées par l'administrateur pour les fêtes
+mobiles non calculables, ex. Aïd). Le masque des jours ouvrables d'un mois
+est calculé une fois par processus et mémorisé ; il est recalculé quand la
+portée 'calendrier' de data_version change (triggers sur jours_feries).
+"""
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+
+from utils import versions
+
+CALENDRIER = versions.CALENDRIER
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jours_feries (
+    date TEXT PRIMARY KEY,
+    libelle TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_jours_feries_version_insert
+AFTER INSERT ON jours_feries
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES ('calendrier', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_jours_feries_version_update
+AFTER UPDATE ON jours_feries
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES ('calendrier', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_jours_feries_version_delete
+AFTER DELETE ON jours_feries
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES ('calendrier', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+"""
+
+# Années pré-remplies par la migration ; les autres via `flask feries --annee`
+ANNEES_PAR_DEFAUT = range(2020, 2041)
+
+
+def month_bounds(annee, mois):
+    """
+    Bornes [début, fin) d'un mois au format ISO, pour des filtres
+    `date >= ? AND date < ?` qui peuvent utiliser les index sur `date`.
+    """
+    annee = int(annee)
+    mois = int(mois)
+    debut = date(annee, mois, 1)
+    fin = date(annee + 1, 1, 1) if mois == 12 else date(annee, mois + 1, 1)
+    return debut.isoformat(), fin.isoformat()
+
+
+def parse_month(valeur):
+    """'2025-04' -> (2025, 4)"""
+    annee, mois = valeur.split("-")[:2]
+    return int(annee), int(mois)
+
+
+def weekday_mask(annee, mois):
+    """Tableau booléen (un élément par jour du mois) : True du lundi au vendredi."""
+    premier = date(int(annee), int(mois), 1).weekday()
+    nb_jours = calendar.monthrange(int(annee), int(mois))[1]
+    return (premier + np.arange(nb_jours)) % 7 < 5
+
+
+# ---------------- Jours fériés ----------------
+def paques(annee):
+    """Dimanche de Pâques (calendrier grégorien, algorithme de Meeus)."""
+    a, b, c = annee % 19, annee // 100, annee % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mois = (h + l - 7 * m + 114) // 31
+    jour = (h + l - 7 * m + 114) % 31 + 1
+    return date(annee, mois, jour)
+
+
+def feries_malgaches(annee):
+    """Fêtes légales de Madagascar pour une année : [(date, libellé)]."""
+    p = paques(annee)
+    return sorted([
+        (date(annee, 1, 1), "Nouvel An"),
+        (date(annee, 3, 8), "Journée internationale de la femme"),
+        (date(annee, 3, 29), "Commémoration des martyrs de 1947"),
+        (p + timedelta(days=1), "Lundi de Pâques"),
+        (date(annee, 5, 1), "Fête du Travail"),
+        (p + timedelta(days=39), "Ascension"),
+        (p + timedelta(days=50), "Lundi de Pentecôte"),
+        (date(annee, 6, 26), "Fête de l'Indépendance"),
+        (date(annee, 8, 15), "Assomption"),
+        (date(annee, 11, 1), "Toussaint"),
+        (date(annee, 12, 25), "Noël"),
+    ])
+
+
+def seed_feries(conn, annees):
+    """Ajoute les fêtes légales des années données (sans écraser l'existant)."""
+    cur = conn.executemany(
+        "INSERT INTO jours_feries (date, libelle) VALUES (?, ?) ON CONFLICT (date) DO NOTHING",
+        [(d.isoformat(), libelle) for annee in annees for d, libelle in feries_malgaches(annee)])
+    return cur.rowcount
+
+
+# ---------------- Calendrier mensuel mémorisé ----------------
+class MoisCalendrier:
+    """
+    Calendrier d'un mois :
+    - ouvrables : tableau booléen par jour (lundi-vendredi hors fériés)
+    - feries : {numéro du jour: libellé}
+    """
+
+    def __init__(self, annee, mois, feries):
+        self.annee = int(annee)
+        self.mois = int(mois)
+        self.feries = feries
+        self.weekdays = weekday_mask(annee, mois)
+        self.ouvrables = self.weekdays.copy()
+        if feries:
+            self.ouvrables[np.array(list(feries)) - 1] = False
+        self.ouvrables.setflags(write=False)
+
+    @property
+    def nb_ouvrables(self):
+        return int(self.ouvrables.sum())
+
+    def jours_ouvrables(self):
+        """Dates des jours ouvrables du mois."""
+        debut = date(self.annee, self.mois, 1)
+        return [debut + timedelta(days=int(i)) for i in np.flatnonzero(self.ouvrables)]
+
+
+# (base, annee, mois) -> (version du calendrier, MoisCalendrier)
+_memo = {}
+
+
+def _base(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def mois_calendrier(conn, annee, mois):
+    """Calendrier du mois, mémorisé tant que jours_feries n'a pas changé."""
+    annee, mois = int(annee), int(mois)
+    cle = (_base(conn), annee, mois)
+    version = versions.get_version(conn, CALENDRIER)[0]
+    memorise = _memo.get(cle)
+    if memorise is not None and memorise[0] == version:
+        return memorise[1]
+    feries = {int(d[8:10]): libelle for d, libelle in conn.execute(
+        "SELECT date, libelle FROM jours_feries WHERE date >= ? AND date < ?", month_bounds(annee, mois))}
+    calendrier_mois = MoisCalendrier(annee, mois, feries)
+    _memo[cle] = (version, calendrier_mois)
+    return calendrier_mois
@@ -0,0 +1,166 @@
+# utils/changelog.py
+"""
+Journal des modifications `changelog`, en ajout seul.
+
+Chaque écriture dans presences ou stagiaire y ajoute une ligne (triggers),
+numérotée par `seq` strictement croissant (AUTOINCREMENT : jamais
+réutilisé, et les écritures SQLite étant sérialisées, l'ordre des `seq`
+est l'ordre des validations). Un consommateur (paie, copie de reporting)
+garde le dernier `seq` traité et ne relit que la suite :
+
+    GET /api/v1/sync?since=<seq>      (ndjson)
+    flask --app app sync --since <seq>
+
+Chaque ligne décrit l'état final d'une clé ('upsert' avec la ligne
+complète, ou 'delete') : rejouer deux fois la même modification est sans
+effet. Pour démarrer une copie, lire d'abord le curseur courant
+(`flask sync --curseur`), puis faire un export complet, puis suivre le
+journal depuis ce curseur.
+
+Le journal grossit avec chaque écriture : `flask sync --purger-avant <seq>`
+supprime ce que tous les consommateurs ont déjà lu. Un curseur antérieur
+à la partie purgée est refusé (StaleCursor) : la copie est à refaire.
+"""
+import json
+
+BATCH_SIZE = 1000
+MAX_LIMIT = 100000
+
+# Ligne JSON complète d'une présence / d'un stagiaire
+_PRESENCE = "json_object('stagiaire_id', {t}.stagiaire_id, 'date', {t}.date, 'presence', {t}.presence, 'time', {t}.time)"
+_STAGIAIRE = ("json_object('id', {t}.id, 'nom_prenoms', {t}.nom_prenoms, 'paositra_money', {t}.paositra_money, "
+              "'bureau', {t}.bureau, 'matricule', {t}.matricule)")
+_MAINTENANT = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS changelog (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,           -- 'presence' ou 'stagiaire'
+    op TEXT NOT NULL,               -- 'upsert' ou 'delete'
+    stagiaire_id INTEGER NOT NULL,
+    date TEXT,                      -- clé (stagiaire_id, date) des présences
+    data TEXT,                      -- ligne complète en JSON, NULL pour 'delete'
+    changed_at TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_changelog_insert
+AFTER INSERT ON presences
+BEGIN
+    INSERT INTO changelog (entity, op, stagiaire_id, date, data, changed_at)
+    VALUES ('presence', 'upsert', NEW.stagiaire_id, NEW.date, {_PRESENCE.format(t="NEW")}, {_MAINTENANT});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_changelog_update
+AFTER UPDATE ON presences
+WHEN OLD.stagiaire_id IS NOT NEW.stagiaire_id OR OLD.date IS NOT NEW.date
+     OR OLD.presence IS NOT NEW.presence OR OLD.time IS NOT NEW.time
+BEGIN
+    -- changement de clé : l'ancienne disparaît
+    INSERT INTO changelog (entity, op, stagiaire_id, date, data, changed_at)
+    SELECT 'presence', 'delete', OLD.stagiaire_id, OLD.date, NULL, {_MAINTENANT}
+    WHERE OLD.stagiaire_id IS NOT NEW.stagiaire_id OR OLD.date IS NOT NEW.date;
+    INSERT INTO changelog (entity, op, stagiaire_id, date, data, changed_at)
+    VALUES ('presence', 'upsert', NEW.stagiaire_id, NEW.date, {_PRESENCE.format(t="NEW")}, {_MAINTENANT});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_changelog_delete
+AFTER DELETE ON presences
+BEGIN
+    INSERT INTO changelog (entity, op, stagiaire_id, date, data, changed_at)
+    VALUES ('presence', 'delete', OLD.stagiaire_id, OLD.date, NULL, {_MAINTENANT});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stagiaire_changelog_insert
+AFTER INSERT ON stagiaire
+BEGIN
+    INSERT INTO changelog (entity, op, stagiaire_id, data, changed_at)
+    VALUES ('stagiaire', 'upsert', NEW.id, {_STAGIAIRE.format(t="NEW")}, {_MAINTENANT});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stagiaire_changelog_update
+AFTER UPDATE ON stagiaire
+WHEN OLD.id IS NOT NEW.id OR OLD.nom_prenoms IS NOT NEW.nom_prenoms
+     OR OLD.paositra_money IS NOT NEW.paositra_money OR OLD.bureau IS NOT NEW.bureau
+     OR OLD.matricule IS NOT NEW.matricule
+BEGIN
+    INSERT INTO changelog (entity, op, stagiaire_id, data, changed_at)
+    SELECT 'stagiaire', 'delete', OLD.id, NULL, {_MAINTENANT} WHERE OLD.id IS NOT NEW.id;
+    INSERT INTO changelog (entity, op, stagiaire_id, data, changed_at)
+    VALUES ('stagiaire', 'upsert', NEW.id, {_STAGIAIRE.format(t="NEW")}, {_MAINTENANT});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stagiaire_changelog_delete
+AFTER DELETE ON stagiaire
+BEGIN
+    INSERT INTO changelog (entity, op, stagiaire_id, data, changed_at)
+    VALUES ('stagiaire', 'delete', OLD.id, NULL, {_MAINTENANT});
+END;
+"""
+
+
+class StaleCursor(Exception):
+    """Le curseur demandé pointe dans une partie purgée du journal."""
+
+
+def current_seq(conn):
+    """Dernier `seq` attribué (0 si le journal est vide)."""
+    return conn.execute("SELECT IFNULL(MAX(seq), 0) FROM changelog").fetchone()[0]
+
+
+def oldest_seq(conn):
+    """Plus petit `seq` encore disponible (le suivant à attribuer si le journal est vide)."""
+    row = conn.execute("SELECT MIN(seq) FROM changelog").fetchone()
+    if row[0] is not None:
+        return row[0]
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changelog'").fetchone()
+    return (row[0] if row else 0) + 1
+
+
+def check_cursor(conn, since):
+    if int(since) + 1 < oldest_seq(conn):
+        raise StaleCursor(since)
+
+
+def purge(conn, before_seq):
+    """Supprime les modifications de `seq` < `before_seq`. Retourne le nombre de lignes supprimées."""
+    n = conn.execute("DELETE FROM changelog WHERE seq < ?", (int(before_seq),)).rowcount
+    conn.commit()
+    return n
+
+
+def iter_changes(conn, since=0, limit=MAX_LIMIT, batch_size=BATCH_SIZE):
+    """
+    Modifications de `seq` > `since`, au plus `limit`, lues par lots de
+    `batch_size` (pagination par clé sur seq) : dicts prêts pour JSON.
+    """
+    restant = max(0, min(int(limit), MAX_LIMIT))
+    while restant:
+        lot = conn.execute("""SELECT seq, entity, op, stagiaire_id, date, data, changed_at FROM changelog
+                              WHERE seq > ? ORDER BY seq LIMIT ?""", (since, min(batch_size, restant))).fetchall()
+        for seq, entity, op, stagiaire_id, jour, data, changed_at in lot:
+            change = {"seq": seq, "entity": entity, "op": op, "stagiaire_id": stagiaire_id}
+            if jour is not None:
+                change["date"] = jour
+            change["data"] = json.loads(data) if data is not None else None
+            change["at"] = changed_at
+            yield change
+        if len(lot) < batch_size:
+            return
+        since = lot[-1][0]
+        restant -= len(lot)
+
+
+def iter_ndjson(conn, since=0, limit=MAX_LIMIT, batch_size=BATCH_SIZE):
+    """
+    Lignes ndjson des modifications puis une dernière ligne
+    {"cursor": <seq à repasser en since>, "more": <reste-t-il des modifications>}.
+    """
+    limit = max(0, min(int(limit), MAX_LIMIT))
+    curseur = int(since)
+    n = 0
+    for change in iter_changes(conn, since, limit, batch_size):
+        curseur = change["seq"]
+        n += 1
+        yield json.dumps(change, ensure_ascii=False, separators=(",", ":")) + "\n"
+    plus = n >= limit and conn.execute("SELECT 1 FROM changelog WHERE seq > ? LIMIT 1", (curseur,)).fetchone() is not None
+    yield json.dumps({"cursor": curseur, "more": plus}) + "\n"
@@ -0,0 +1,118 @@
+# utils/db.py
+"""
+Couche d'accès SQLite partagée par l'application et les exports.
+
+- une petite réserve (pool) de connexions par processus / par fichier de base ;
+- les PRAGMA (WAL, busy_timeout, cache...) sont appliqués une seule fois,
+  à l'ouverture de chaque connexion ;
+- côté Flask, une connexion par requête est empruntée au pool via `g`
+  et rendue automatiquement à la fin du contexte applicatif.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+from utils import metrics
+
+# Attente maximale (ms) quand la base est verrouillée par un autre worker
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Nombre de connexions gardées ouvertes par processus
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",       # ~16 Mo de cache de pages
+    "PRAGMA mmap_size=134217728",     # 128 Mo mappés en mémoire
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def connect(db_path):
+    """Ouvre une connexion configurée (PRAGMA appliqués une fois)."""
+    # Connexions chronométrées seulement si l'instrumentation est activée
+    factory = metrics.TimedConnection if metrics.ENABLED else sqlite3.Connection
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Réserve de connexions pour un fichier de base, propre à un processus."""
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.db_path)
+
+    def release(self, conn):
+        # Ne jamais rendre au pool une connexion avec une transaction ouverte
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    # Clé sur le pid : après un fork (gunicorn --preload) chaque worker
+    # reconstruit ses propres connexions au lieu d'hériter de celles du parent.
+    key = (os.getpid(), os.path.abspath(db_path))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(db_path))
+    return pool
+
+
+@contextmanager
+def pooled(db_path):
+    """Emprunte une connexion au pool le temps d'un bloc `with`."""
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+# ---------------- Intégration Flask ----------------
+def get_db():
+    """Connexion de la requête courante (empruntée au premier appel)."""
+    if "db" not in g:
+        g.db = get_pool(current_app.config["DATABASE"]).acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        get_pool(current_app.config["DATABASE"]).release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
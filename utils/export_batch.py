@@ -0,0 +1,171 @@
+# utils/export_batch.py
+"""
+Exports groupés : plusieurs mois et/ou un document par bureau, en ZIP.
+
+Pour les PDF, toutes les présences de la période sont lues en une seule
+requête par intervalle, partitionnées en mémoire par (mois, bureau), puis
+chaque document est mis en page dans un pool de processus. Les états
+Excel sont écrits en flux par les processus du pool, chacun lisant son
+mois et son bureau dans la base.
+"""
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import archives
+from utils.calendrier import month_bounds, mois_calendrier
+from utils.db import pooled
+from utils.grille import MonthGrid
+from utils.roster import get_roster
+
+
+def iter_months(debut, fin):
+    """Mois (annee, mois) de `debut` à `fin` inclus."""
+    annee, mois = debut
+    while (annee, mois) <= tuple(fin):
+        yield annee, mois
+        annee, mois = (annee + 1, 1) if mois == 12 else (annee, mois + 1)
+
+
+def list_bureaux(conn):
+    return get_roster(conn).bureaux
+
+
+def load_period(conn, debut, fin, bureaux=None):
+    """
+    Charge stagiaires, présences et totaux de la période.
+    Retourne (stagiaires, presences, totaux) ; stagiaires inclut le bureau.
+    """
+    stagiaires = [(l[0], l[4], l[1], l[2], l[3]) for l in get_roster(conn).by_matricule_order(bureaux)]
+
+    borne_debut = month_bounds(*debut)[0]
+    borne_fin = month_bounds(*fin)[1]
+    presences = conn.execute(f"""
+        SELECT stagiaire_id, date, presence FROM {archives.presences_source(conn, borne_debut, borne_fin)}
+        WHERE date >= ? AND date < ?
+    """, (borne_debut, borne_fin)).fetchall()
+    totaux = conn.execute("""
+        SELECT year_month, stagiaire_id, total_days FROM presence_monthly
+        WHERE year_month >= ? AND year_month <= ?
+    """, (borne_debut[:7], f"{fin[0]:04d}-{fin[1]:02d}")).fetchall()
+    return stagiaires, presences, totaux
+
+
+def partition(stagiaires, presences, totaux, mois_list, par_bureau=True):
+    """
+    Découpe les données chargées en documents.
+    Retourne {(annee, mois, bureau|None): (stagiaires, presences, totaux)}.
+    """
+    bureau_de = {s[0]: s[4] for s in stagiaires}
+    groupes = defaultdict(list)
+    for s in stagiaires:
+        groupes[s[4] if par_bureau else None].append(s[:4])
+
+    pres_par_cle = defaultdict(list)
+    for ligne in presences:
+        sid = ligne[0]
+        if sid not in bureau_de:
+            continue
+        ym = ligne[1][:7]
+        pres_par_cle[(ym, bureau_de[sid] if par_bureau else None)].append(ligne)
+    totaux_par_mois = defaultdict(dict)
+    for ym, sid, total in totaux:
+        totaux_par_mois[ym][sid] = total
+
+    documents = {}
+    for annee, mois in mois_list:
+        ym = f"{annee:04d}-{mois:02d}"
+        for bureau, liste in groupes.items():
+            lignes = pres_par_cle.get((ym, bureau))
+            if not lignes:
+                # aucun stagiaire présent : pas de document vide
+                continue
+            documents[(annee, mois, bureau)] = (liste, lignes, totaux_par_mois.get(ym, {}))
+    return documents
+
+
+def _nom_fichier(fmt, annee, mois, bureau):
+    suffixe = f"_{bureau}" if bureau else ""
+    suffixe = "".join(c if c.isalnum() or c in "-_" else "_" for c in suffixe)
+    return f"{annee:04d}-{mois:02d}/Etat_presences_{annee:04d}_{mois:02d}{suffixe}.{fmt}"
+
+
+def non_empty_documents(conn, debut, fin, bureaux=None, par_bureau=True):
+    """
+    Documents à produire, lus dans la synthèse mensuelle : (annee, mois,
+    bureau|None) ayant au moins un stagiaire présent.
+    """
+    sql = """SELECT DISTINCT m.year_month, {bureau} FROM presence_monthly m
+             JOIN stagiaire s ON s.id = m.stagiaire_id
+             WHERE m.year_month >= ? AND m.year_month <= ? AND m.total_days <> 0"""
+    params = [f"{debut[0]:04d}-{debut[1]:02d}", f"{fin[0]:04d}-{fin[1]:02d}"]
+    if bureaux:
+        sql += f" AND s.bureau IN ({','.join('?' * len(bureaux))})"
+        params += list(bureaux)
+    lignes = conn.execute(sql.format(bureau="s.bureau" if par_bureau else "NULL"), params).fetchall()
+    return sorted(((int(ym[:4]), int(ym[5:7]), bureau) for ym, bureau in lignes),
+                  key=lambda d: (d[0], d[1], d[2] or ""))
+
+
+def render_document(args):
+    """Rendu PDF d'un document à partir des données partitionnées (exécuté dans le pool de processus)."""
+    fmt, annee, mois, bureau, stagiaires, presences, totaux, ouvrables = args
+    from utils.export_pdf_officiel import render_etat_presences_pdf
+    grid = MonthGrid.from_rows(stagiaires, presences, annee, mois, ouvrables)
+    sortie = render_etat_presences_pdf(grid, totaux, bureau=bureau)
+    return _nom_fichier(fmt, annee, mois, bureau), sortie.getvalue()
+
+
+def stream_document(args):
+    """Rendu Excel d'un document, lu en flux dans la base (exécuté dans le pool de processus)."""
+    fmt, annee, mois, bureau, db_path, bureaux = args
+    from utils.export_excel_officiel import generate_etat_presences_excel
+    with generate_etat_presences_excel(db_path, mois, annee, bureaux=[bureau] if bureau else bureaux) as sortie:
+        return _nom_fichier(fmt, annee, mois, bureau), sortie.read()
+
+
+def _rendre(tache):
+    return (render_document if tache[0] == "pdf" else stream_document)(tache)
+
+
+def generate_batch_zip(db_path, debut, fin, output, bureaux=None, formats=("pdf",), par_bureau=True,
+                       max_workers=None, progression=None):
+    """
+    Écrit dans `output` (fichier binaire) un ZIP contenant un état par mois,
+    par format et, si `par_bureau`, par bureau. Retourne le nombre de documents.
+    Les états Excel sont lus en flux par chaque processus : seuls les PDF
+    demandent de charger la période en mémoire.
+    - max_workers=1 : rendu dans le processus courant, sans pool (tâche de fond)
+    - progression : fonction appelée avec la part des documents écrits (0..1)
+    """
+    mois_list = list(iter_months(debut, fin))
+    with pooled(db_path) as conn:
+        cles = non_empty_documents(conn, debut, fin, bureaux, par_bureau)
+        if "pdf" in formats:
+            stagiaires, presences, totaux = load_period(conn, debut, fin, bureaux)
+            ouvrables = {m: mois_calendrier(conn, *m).ouvrables for m in mois_list}
+    if "pdf" in formats:
+        documents = partition(stagiaires, presences, totaux, mois_list, par_bureau)
+
+    taches = []
+    for annee, mois, bureau in cles:
+        for fmt in formats:
+            if fmt == "pdf":
+                taches.append((fmt, annee, mois, bureau, *documents[(annee, mois, bureau)],
+                               ouvrables[(annee, mois)]))
+            else:
+                taches.append((fmt, annee, mois, bureau, db_path, list(bureaux or [])))
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        if max_workers == 1:
+            _ecrire(archive, map(_rendre, taches), len(taches), progression)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                _ecrire(archive, pool.map(_rendre, taches), len(taches), progression)
+    return len(taches)
+
+
+def _ecrire(archive, documents, nombre, progression):
+    for i, (nom, contenu) in enumerate(documents, 1):
+        archive.writestr(nom, contenu)
+        if progression:
+            progression(i / nombre)
@@ -0,0 +1,80 @@
+# utils/export_cache.py
+"""
+Cache disque des états exportés (PDF / Excel).
+
+La clé est un condensat de (format, année, mois, version des données) :
+un mois inchangé n'est jamais regénéré, et toute écriture dans le mois
+change la version donc la clé. L'éviction est LRU à taille bornée, la
+date de modification des fichiers servant de date de dernier accès.
+Partagé entre workers (écriture atomique via os.replace).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+class ExportCache:
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(fmt, annee, mois, version):
+        brut = f"{fmt}|{int(annee):04d}|{int(mois):02d}|{version}"
+        return hashlib.sha256(brut.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Fichier ouvert (lecture binaire) ou None si absent du cache."""
+        path = self._path(key)
+        try:
+            fichier = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # marque l'entrée comme récemment utilisée
+        except OSError:
+            pass
+        return fichier
+
+    def put(self, key, data):
+        """
+        Enregistre `data` (bytes, BytesIO ou fichier ouvert, relu depuis sa
+        position courante puis rembobiné) et retourne le fichier du cache ouvert.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(data, "read"):
+                debut = data.tell()
+                shutil.copyfileobj(data, f)
+                data.seek(debut)
+            else:
+                f.write(data)
+        os.replace(tmp, self._path(key))
+        fichier = open(self._path(key), "rb")
+        self.evict()
+        return fichier
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes."""
+        entrees = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if e.is_file() and not e.name.startswith(".tmp-"):
+                    st = e.stat()
+                    entrees.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
+        for _, taille, path in sorted(entrees):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= taille
@@ -1,49 +1,63 @@
-import sqlite3
 import calendar
-import io
+import tempfile
+from itertools import groupby
 import xlsxwriter
+from utils.db import pooled
+from utils import archives, metrics, rollup
+from utils.calendrier import month_bounds
 
-def generate_etat_presences_excel(db_path, mois, annee):
+# Présences du mois dans l'ordre d'écriture (matricule, date). CROSS JOIN
+# impose de parcourir stagiaire par l'index unique sur matricule, puis les
+# clés primaires de presence_monthly et de presences : SQLite ne trie que
+# les jours d'un stagiaire à la fois, jamais le mois entier. Seuls les
+# stagiaires ayant au moins une présence dans le mois figurent sur l'état.
+# {source} : presences, ou l'archive de l'année (utils.archives).
+STREAM_SQL = """
+    SELECT s.id, s.matricule, s.nom_prenoms, s.paositra_money, m.total_days,
+           CAST(substr(p.date, 9, 2) AS INTEGER), p.presence
+    FROM stagiaire s
+    CROSS JOIN presence_monthly m ON m.year_month = ? AND m.stagiaire_id = s.id
+    LEFT JOIN {source} p ON p.stagiaire_id = s.id AND p.date >= ? AND p.date < ?
+    WHERE m.total_days <> 0{filtre}
+    ORDER BY s.matricule, p.date
+"""
+
+
+@metrics.timed_render("xlsx")
+def generate_etat_presences_excel(db_path, mois, annee, bureaux=None):
+    """
+    Génère l'état mensuel en flux : le curseur est lu ligne à ligne, chaque
+    ligne du classeur est écrite dès qu'elle est complète (xlsxwriter en
+    mode constant_memory) et le fichier est produit dans un fichier
+    temporaire, retourné ouvert et positionné au début.
+    - bureaux : liste de bureaux à inclure (tous par défaut)
+    """
     mois = int(mois)
     annee = int(annee)
     nb_jours = calendar.monthrange(annee, mois)[1]
 
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
+    filtre = f" AND s.bureau IN ({','.join('?' * len(bureaux))})" if bureaux else ""
+    params = [rollup.year_month(annee, mois), *month_bounds(annee, mois), *(bureaux or [])]
 
-        # Récupérer stagiaires
-        cursor.execute("""
-            SELECT id, matricule, nom_prenoms, paositra_money 
-            FROM stagiaire 
-            ORDER BY matricule ASC
-        """)
-        stagiaires = cursor.fetchall()
+    with pooled(db_path) as conn:
+        source = archives.presences_source(conn, *month_bounds(annee, mois))
+        cursor = conn.execute(STREAM_SQL.format(filtre=filtre, source=source), params)
+        lignes = _lignes_curseur(cursor, nb_jours)
+        return _ecrire_classeur(nb_jours, lignes, tempfile.TemporaryFile(), {'constant_memory': True})
 
-        # Récupérer présences du mois
-        cursor.execute("""
-            SELECT stagiaire_id, date, presence
-            FROM presences
-            WHERE strftime('%m', date) = ? 
-              AND strftime('%Y', date) = ?
-        """, (f"{mois:02d}", str(annee)))
-        pres_rows = cursor.fetchall()
 
-    # Initialiser tableau des présences
-    pres_by_stagiaire = {s[0]: {d: 0 for d in range(1, nb_jours+1)} for s in stagiaires}
-    totals = {s[0]: 0.0 for s in stagiaires}
+def _lignes_curseur(cursor, nb_jours):
+    """(matricule, nom, paositra, total, libellés des jours) par stagiaire."""
+    for _, groupe in groupby(cursor, key=lambda r: r[0]):
+        jours = ["0"] * nb_jours
+        for _, matricule, nom, paositra, total, jour, presence in groupe:
+            if jour is not None:
+                jours[jour - 1] = "1" if presence == 1 else "0.5" if presence == 0.5 else "0"
+        yield matricule, nom, paositra, float(total), jours
 
-    for sid, date_str, presence in pres_rows:
-        try:
-            d = int(date_str.split("-")[2])
-        except ValueError:
-            continue
-        val = float(presence)
-        pres_by_stagiaire[sid][d] = val
-        totals[sid] += val
 
-    # Préparer Excel en mémoire
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+def _ecrire_classeur(nb_jours, lignes, output, options):
+    workbook = xlsxwriter.Workbook(output, options)
     worksheet = workbook.add_worksheet("Présences")
 
     # Styles
@@ -53,28 +67,17 @@ def generate_etat_presences_excel(db_path, mois, annee):
     # Écrire en-tête
     jours_headers = [str(i) for i in range(1, nb_jours+1)]
     header = ["N°", "MATRICULE", "NOM ET PRÉNOMS", "Attribution"] + jours_headers + ["T. Jours", "PAOSITRA MONEY"]
+    # Largeur des colonnes fixée avant les lignes (obligatoire en mode constant_memory)
+    worksheet.set_column(0, len(header)-1, 12)
     worksheet.write_row(0, 0, header, header_format)
 
     # Remplir données
-    row_idx = 1
-    numero = 1
-    for sid, matricule, nom, paositra in stagiaires:
-        total = totals[sid]
-        if total == 0:
-            continue
-
-        row = [numero, matricule, nom, "Stagiaire"]
-        row += [str(pres_by_stagiaire[sid][i]).rstrip('0').rstrip('.') if pres_by_stagiaire[sid][i] != 0 else "0"
-                for i in range(1, nb_jours+1)]
+    for row_idx, (matricule, nom, paositra, total, jours) in enumerate(lignes, start=1):
+        row = [row_idx, matricule, nom, "Stagiaire"] + jours
         total_display = int(total) if total.is_integer() else round(total, 1)
         row += [total_display, paositra or ""]
 
         worksheet.write_row(row_idx, 0, row, cell_center)
-        numero += 1
-        row_idx += 1
-
-    # Ajuster largeur colonnes
-    worksheet.set_column(0, len(header)-1, 12)
 
     workbook.close()
     output.seek(0)
@@ -1,20 +1,68 @@
 # utils/export_pdf_officiel.py
-import sqlite3
-import locale
-try:
-    locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')
-except locale.Error:
-    # Si la locale française n'est pas dispo, on garde la locale par défaut
-    pass
-import calendar
-from datetime import datetime, date
+import io
+import os
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
-import os
+from utils.db import pooled
+from utils import metrics, rollup
+from utils.grille import load_month_grid
+import numpy as np
+
+# Noms des mois (indépendants de la locale du serveur)
+MOIS_FR = [
+    "", "JANVIER", "FÉVRIER", "MARS", "AVRIL", "MAI", "JUIN",
+    "JUILLET", "AOÛT", "SEPTEMBRE", "OCTOBRE", "NOVEMBRE", "DÉCEMBRE"
+]
+
+# Styles et mise en page construits une seule fois par processus ; le style
+# "Title" de la feuille d'exemple n'est plus modifié sur place.
+PAGE = landscape(A4)
+MARGE_H = 0*cm
+MARGE_V = 1*cm
+CADRE_PADDING = 6  # marge intérieure du cadre de SimpleDocTemplate (haut et bas)
+_STYLES = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle("EtatTitre", parent=_STYLES["Title"], fontSize=14, leading=14)
+SUBTITLE_STYLE = _STYLES["Heading3"]
+
+# Hauteur fixe des lignes, identique à celle que ReportLab calculait (interligne
+# par défaut des cellules 12 + marges haut/bas de 3) : pas de mesure cellule par cellule
+ROW_HEIGHT = 12 + 2 * 3
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.darkgray),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0,0), (-1, -1), 7),
+    ('GRID', (0,0), (-1,-1), 0.4, colors.black),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 2),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+])
+FOOTER_STYLE = TableStyle([
+    ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+    ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+    ('FONTSIZE', (0,0), (-1,-1), 10),
+])
+
+
+def _lignes_par_page(hauteur):
+    """Nombre de lignes de données tenant dans `hauteur` points, en-tête compris."""
+    return max(1, int(hauteur // ROW_HEIGHT) - 1)
+
+
+def _plages(masque):
+    """Plages [(début, fin)] d'indices consécutifs à True dans `masque`."""
+    indices = np.flatnonzero(masque)
+    if not len(indices):
+        return []
+    coupures = np.flatnonzero(np.diff(indices) > 1)
+    debuts = np.concatenate(([indices[0]], indices[coupures + 1]))
+    fins = np.concatenate((indices[coupures], [indices[-1]]))
+    return [(int(d), int(f)) for d, f in zip(debuts, fins)]
 
 
 def generate_etat_presences_pdf(db_path, mois, annee, output_filename=None, lieu="ANTANANARIVO"):
@@ -22,53 +70,37 @@ def generate_etat_presences_pdf(db_path, mois, annee, output_filename=None, lieu
     Génère un PDF au format "ÉTAT POUR SERVIR AU PAIEMENT DES INDEMNITÉS DES STAGIAIRES".
     - mois : '01'..'12' ou int
     - annee : '2025' ou int
-    - output_filename : chemin du pdf à créer (par défaut 'Etat_Stagiaires_<annee>_<mois>.pdf')
+    - output_filename : chemin du pdf à créer ; si absent, le PDF est rendu en
+      mémoire et retourné sous forme de BytesIO (rien n'est écrit sur disque)
     """
     # Normalisations
     mois = int(mois)
     annee = int(annee)
-    nb_jours = calendar.monthrange(annee, mois)[1]
-    # Remplace l'utilisation de calendar.month_name[...] par :
-    mois_fr = [
-        "", "JANVIER", "FÉVRIER", "MARS", "AVRIL", "MAI", "JUIN",
-        "JUILLET", "AOÛT", "SEPTEMBRE", "OCTOBRE", "NOVEMBRE", "DÉCEMBRE"
-    ]
-    mois_en_francais = mois_fr[mois]
-
-    if output_filename is None:
-        output_filename = f"Etat_présences_{annee}_{mois:02d}.pdf"
-    tmp_path = output_filename
-
-    # Récupérer données depuis la DB
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Récupérer stagiaires (id, matricule, nom_prenoms, paositra_money)
-    cursor.execute("SELECT id, matricule, nom_prenoms, paositra_money FROM stagiaire ORDER BY matricule ASC")
-    stagiaires = cursor.fetchall()
-
-    # Récupérer présences du mois (stagiaire_id, date, presence)
-    cursor.execute("""
-        SELECT stagiaire_id, date, presence
-        FROM presences
-        WHERE strftime('%m', date) = ? AND strftime('%Y', date) = ?
-    """, (f"{mois:02d}", str(annee)))
-    pres_rows = cursor.fetchall()
-    conn.close()
-
-    # Organiser présences par stagiaire
-    pres_by_stagiaire = {s[0]: {d: "0" for d in range(1, nb_jours+1)} for s in stagiaires}
-    totals = {s[0]: 0.0 for s in stagiaires}
-    for sid, date_str, presence in pres_rows:
-        try:
-            d = int(date_str.split("-")[2])
-        except Exception:
-            continue
-        val = float(presence)
-        # Représentation dans le tableau : "1", "0.5" ou "0"
-        affichage = "1" if val == 1 else ("0.5" if val == 0.5 else "0")
-        pres_by_stagiaire.setdefault(sid, {i: "0" for i in range(1, nb_jours+1)})[d] = affichage
-        totals[sid] = totals.get(sid, 0.0) + val
+
+    # Récupérer données depuis la DB : grille stagiaires × jours + totaux de la synthèse mensuelle
+    with pooled(db_path) as conn:
+        grid = load_month_grid(conn, annee, mois)
+        totals = rollup.monthly_totals(conn, annee, mois)
+
+    return render_etat_presences_pdf(grid, totals, output_filename=output_filename, lieu=lieu)
+
+
+@metrics.timed_render("pdf")
+def render_etat_presences_pdf(grid, totals=None, output_filename=None, lieu="ANTANANARIVO", bureau=None):
+    """
+    Met en page l'état à partir d'une grille déjà chargée (utilisé aussi par
+    les exports groupés, qui chargent plusieurs mois en une seule requête).
+    - grid : MonthGrid dont les stagiaires sont (id, matricule, nom_prenoms, paositra_money)
+    - totals : {stagiaire_id: total du mois} ; à défaut, totaux calculés sur la grille
+    - bureau : si renseigné, ajouté au sous-titre
+    """
+    mois = grid.mois
+    annee = grid.annee
+    nb_jours = grid.nb_jours
+    mois_en_francais = MOIS_FR[mois]
+
+    # Rendu en mémoire par défaut : pas de fichier partagé entre deux exports simultanés
+    output = io.BytesIO() if output_filename is None else output_filename
 
     # Construire les données du tableau
     # En-tête : N°, MATRICULE, NOM ET PRÉNOMS, Attribution, jours..., T. Jours, PAOSITRA MONEY
@@ -76,66 +108,51 @@ def generate_etat_presences_pdf(db_path, mois, annee, output_filename=None, lieu
     header = ["N°", "MATRICULE", "NOM ET PRÉNOMS", "Attribution"] + jours_headers + ["T. Jours", "PAOSITRA MONEY"]
     table_data = [header]
 
-    numero = 1
-    for sid, matricule, nom, paositra in stagiaires:
-        total = totals.get(sid, 0.0)
-        if total == 0:
-            # On ignore ce stagiaire car il n'a aucune présence
-            continue
-
-        row = [numero, matricule, nom, "Stagiaire"]
-        row += [pres_by_stagiaire.get(sid, {}).get(i, "0") for i in range(1, nb_jours+1)]
-
+    # Seuls les stagiaires ayant au moins une présence dans le mois figurent sur l'état
+    for numero, ((sid, matricule, nom, paositra), total, jours) in enumerate(grid.rows_with_presence(totals), start=1):
         total_display = int(total) if float(total).is_integer() else f"{total:.1f}"
-        row += [total_display, paositra if paositra is not None else ""]
-        table_data.append(row)
-        numero += 1
-
+        table_data.append([numero, matricule, nom, "Stagiaire"] + jours
+                          + [total_display, paositra if paositra is not None else ""])
 
     # Création du PDF avec ReportLab
-    doc = SimpleDocTemplate(tmp_path, pagesize=landscape(A4), leftMargin=0*cm, rightMargin=0*cm, topMargin=1*cm, bottomMargin=1*cm)
-    styles = getSampleStyleSheet()
+    doc = SimpleDocTemplate(output, pagesize=PAGE, leftMargin=MARGE_H, rightMargin=MARGE_H,
+                            topMargin=MARGE_V, bottomMargin=MARGE_V)
     elements = []
 
-    title_style = styles["Title"]
-    title_style.fontSize = 14
-    title_style.leading = 14
-
-    mois_en_francais = calendar.month_name[int(mois)].upper()
-    texte = f"LIEU DE STAGE PRINCIPAL : ANTANANARIVO - {mois_en_francais} {annee}"
-    elements.append(Paragraph("ÉTAT POUR SERVIR AU PAIEMENT DES INDEMNITÉS DES STAGIAIRES", title_style))
-    elements.append(Paragraph(texte, styles["Heading3"]))
-    elements.append(Spacer(1, 0.2*cm))
+    # Paragraph interprète son texte comme du balisage : & et < des libellés échappés
+    texte = f"LIEU DE STAGE PRINCIPAL : {escape(lieu)} - {mois_en_francais} {annee}"
+    if bureau:
+        texte += f" - {escape(bureau)}"
+    titre = [Paragraph("ÉTAT POUR SERVIR AU PAIEMENT DES INDEMNITÉS DES STAGIAIRES", TITLE_STYLE),
+             Paragraph(texte, SUBTITLE_STYLE),
+             Spacer(1, 0.2*cm)]
+    elements.extend(titre)
 
-    # Table : possibilité d'ajuster colonnes
-    # Calcul largeurs approximatives : N° (1cm), matricule (2.5cm), nom (7cm), attribution (3cm), jours (0.7cm chacun), total (1.5cm), paositra (3.5cm)
+    # Table : largeurs et hauteurs fixées d'avance, ReportLab n'a rien à mesurer
     day_col_width = 0.45*cm
     col_widths = [0.5*cm, 1.5*cm, 7.0*cm, 1.5*cm] + [day_col_width]*nb_jours + [0.8*cm, 2.5*cm]
 
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
-
-    # Style du tableau
-    style = TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.darkgray),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1, -1), 7),
-        ('GRID', (0,0), (-1,-1), 0.4, colors.black),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 2),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 2),
-    ])
-
-    # Colorer les weekends en gris clair
-    for day in range(1, nb_jours+1):
-        dt_obj = date(annee, mois, day)
-        if dt_obj.weekday() in (5,6):  # samedi=5 dimanche=6
-            col_idx = 4 + (day-1)
-            style.add('BACKGROUND', (col_idx, 1), (col_idx, -1), colors.lightgrey)
-
-    table.setStyle(style)
-    elements.append(table)
+    # Style du tableau : style de base partagé + weekends et jours fériés grisés
+    # (une commande par plage de jours consécutifs)
+    style = TableStyle(parent=TABLE_STYLE)
+    for debut, fin in _plages(~grid.ouvrables):
+        style.add('BACKGROUND', (4 + debut, 1), (4 + fin, -1), colors.lightgrey)
+
+    # Une table par page (en-tête répété) au lieu d'une seule table découpée par ReportLab
+    hauteur_cadre = doc.height - 2 * CADRE_PADDING
+    hauteur_titre = sum(f.wrap(doc.width, hauteur_cadre)[1] + f.getSpaceBefore() + f.getSpaceAfter()
+                        for f in titre)
+    premiere_page = _lignes_par_page(hauteur_cadre - hauteur_titre)
+    par_page = _lignes_par_page(hauteur_cadre)
+    lignes = table_data[1:]
+    morceaux = [lignes[:premiere_page]] + [lignes[i:i + par_page]
+                                            for i in range(premiere_page, len(lignes), par_page)]
+    for i, morceau in enumerate(morceaux):
+        if i:
+            elements.append(PageBreak())
+        table = Table([header] + morceau, colWidths=col_widths, rowHeights=[ROW_HEIGHT] * (len(morceau) + 1))
+        table.setStyle(style)
+        elements.append(table)
     elements.append(Spacer(1, 0.5*cm))
 
     # Footer signatures
@@ -144,15 +161,13 @@ def generate_etat_presences_pdf(db_path, mois, annee, output_filename=None, lieu
         ["DIRECTION DES COMPTES POSTAUX", "CHEF DE CENTRE DE L'ÉPARGNE POSTALE"]
     ]
     footer_tbl = Table(footer_table_data, colWidths=[12*cm, 12*cm])
-    footer_style = TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-        ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
-        ('FONTSIZE', (0,0), (-1,-1), 10),
-    ])
-    footer_tbl.setStyle(footer_style)
+    footer_tbl.setStyle(FOOTER_STYLE)
     elements.append(Spacer(1, 1*cm))
     elements.append(footer_tbl)
 
     doc.build(elements)
 
-    return os.path.abspath(tmp_path)
+    if output_filename is not None:
+        return os.path.abspath(output_filename)
+    output.seek(0)
+    return output
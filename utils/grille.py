@@ -0,0 +1,128 @@
+# utils/grille.py
+"""
+Grille mensuelle stagiaires × jours en NumPy, partagée par les exports,
+l'API et la saisie admin.
+
+Une seule matrice float32 (n_stagiaires × n_jours) remplace les
+dictionnaires par stagiaire et par jour : totaux, demi-journées et
+absences sont calculés en bloc ; le masque des jours ouvrables vient de
+utils.calendrier.
+"""
+import calendar
+
+import numpy as np
+
+from utils import archives
+from utils.calendrier import month_bounds, mois_calendrier, weekday_mask
+from utils.roster import get_roster
+
+LIBELLES = np.array(["0", "0.5", "1"], dtype=object)
+
+
+class MonthGrid:
+    """
+    - stagiaires : liste de tuples dont le premier élément est l'id (ordre conservé)
+    - values : matrice des présences (0 si non saisie)
+    - saisi : matrice booléenne, True si une ligne existe dans presences
+    - ouvrables : masque des jours ouvrables (fériés exclus) ; à défaut,
+      lundi-vendredi
+    """
+
+    def __init__(self, annee, mois, stagiaires, values, saisi, ouvrables=None):
+        self.annee = int(annee)
+        self.mois = int(mois)
+        self.nb_jours = values.shape[1]
+        self.stagiaires = stagiaires
+        self.values = values
+        self.saisi = saisi
+        self.ouvrables = weekday_mask(annee, mois) if ouvrables is None else ouvrables
+
+    @classmethod
+    def from_rows(cls, stagiaires, pres_rows, annee, mois, ouvrables=None):
+        """
+        Construit la grille à partir de lignes (stagiaire_id, jour, presence),
+        `jour` étant le numéro du jour (int) ou la date 'AAAA-MM-JJ'.
+        Les présences de stagiaires absents de `stagiaires` sont ignorées.
+        """
+        nb_jours = calendar.monthrange(int(annee), int(mois))[1]
+        n = len(stagiaires)
+        values = np.zeros((n, nb_jours), dtype=np.float32)
+        saisi = np.zeros((n, nb_jours), dtype=bool)
+        if n and pres_rows:
+            ids = np.fromiter((s[0] for s in stagiaires), dtype=np.int64, count=n)
+            ordre = np.argsort(ids)
+            ids_tries = ids[ordre]
+            sids = np.fromiter((r[0] for r in pres_rows), dtype=np.int64, count=len(pres_rows))
+            jours = np.fromiter((r[1] if isinstance(r[1], int) else int(r[1][8:10]) for r in pres_rows),
+                                dtype=np.int64, count=len(pres_rows))
+            vals = np.fromiter((r[2] for r in pres_rows), dtype=np.float32, count=len(pres_rows))
+            pos = np.searchsorted(ids_tries, sids)
+            pos = np.minimum(pos, n - 1)
+            connus = (ids_tries[pos] == sids) & (jours >= 1) & (jours <= nb_jours)
+            lignes = ordre[pos[connus]]
+            colonnes = jours[connus] - 1
+            values[lignes, colonnes] = vals[connus]
+            saisi[lignes, colonnes] = True
+        return cls(annee, mois, stagiaires, values, saisi, ouvrables)
+
+    # ---- agrégats vectorisés ----
+    @property
+    def totals(self):
+        return self.values.sum(axis=1, dtype=np.float64)
+
+    @property
+    def half_days(self):
+        return (self.saisi & (self.values == 0.5)).sum(axis=1)
+
+    @property
+    def absent_days(self):
+        return (self.saisi & (self.values == 0)).sum(axis=1)
+
+    @property
+    def weekday_mask(self):
+        return weekday_mask(self.annee, self.mois)
+
+    def labels(self):
+        """Matrice des libellés affichés : "1", "0.5" ou "0"."""
+        index = np.where(self.values == 1, 2, np.where(self.values == 0.5, 1, 0))
+        return LIBELLES[index]
+
+    def rows_with_presence(self, totals=None):
+        """
+        Itère sur (stagiaire, total, libellés_des_jours) pour les stagiaires
+        dont le total du mois est non nul (règle des états officiels).
+        `totals` permet de fournir des totaux déjà connus (synthèse mensuelle).
+        """
+        if totals is None:
+            totaux = self.totals
+        else:
+            totaux = np.fromiter((float(totals.get(s[0], 0.0)) for s in self.stagiaires),
+                                 dtype=np.float64, count=len(self.stagiaires))
+        libelles = self.labels()
+        for i in np.flatnonzero(totaux != 0):
+            yield self.stagiaires[i], float(totaux[i]), libelles[i].tolist()
+
+
+def load_month_grid(conn, annee, mois, stagiaires=None, stagiaire_id=None):
+    """
+    Charge un mois depuis la base. Par défaut tous les stagiaires
+    (id, matricule, nom_prenoms, paositra_money) triés par matricule, lus
+    dans le cache de la liste (utils.roster).
+    """
+    if stagiaires is None:
+        roster = get_roster(conn)
+        if stagiaire_id is not None:
+            ligne = roster.get(stagiaire_id)
+            lignes = [ligne] if ligne else []
+        else:
+            lignes = roster.by_matricule_order()
+        stagiaires = [(l[0], l[4], l[1], l[2]) for l in lignes]
+    debut, fin = month_bounds(annee, mois)
+    sql = f"""SELECT stagiaire_id, CAST(substr(date, 9, 2) AS INTEGER), presence
+              FROM {archives.presences_source(conn, debut, fin)} WHERE date >= ? AND date < ?"""
+    params = [debut, fin]
+    if stagiaire_id is not None:
+        sql += " AND stagiaire_id = ?"
+        params.append(stagiaire_id)
+    return MonthGrid.from_rows(stagiaires, conn.execute(sql, params).fetchall(), annee, mois,
+                               mois_calendrier(conn, annee, mois).ouvrables)
@@ -0,0 +1,209 @@
+# utils/import_stagiaires.py
+"""
+Import en masse de stagiaires ou de présences depuis un fichier CSV ou XLSX.
+
+Le fichier est lu ligne par ligne (pas de chargement complet en mémoire),
+chaque ligne est validée contre des ensembles préchargés une seule fois
+(matricules, PAOSITRA MONEY, comptes), puis les lignes valides sont
+insérées par paquets, chacun dans sa propre transaction. Les mots de
+passe initiaux sont hachés dans un pool de processus, hors transaction.
+
+La page /import lance ces fonctions dans une tâche de fond (utils/jobs.py,
+tâche "import") ; les commandes flask les appellent directement.
+"""
+import csv
+import io
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from utils import archives
+from utils.auth import hash_password
+from utils.jobs import mp_context
+
+from utils.saisie_presences import save_presences
+
+TAILLE_PAQUET = 500
+
+# En-têtes acceptés -> nom de colonne interne
+ALIAS = {
+    "nom_prenoms": "nom_prenoms", "nom": "nom_prenoms", "nom et prenoms": "nom_prenoms",
+    "nom_et_prenoms": "nom_prenoms",
+    "bureau": "bureau", "attribution": "bureau",
+    "paositra_money": "paositra_money", "paositra": "paositra_money", "paositra money": "paositra_money",
+    "matricule": "matricule",
+    "date": "date",
+    "presence": "presence",
+}
+
+
+class ImportReport:
+    """Résultat d'un import : compteurs + erreurs par ligne."""
+
+    def __init__(self):
+        self.lues = 0
+        self.inserees = 0
+        self.erreurs = []  # (numero_ligne, identifiant, message)
+
+    def erreur(self, numero, identifiant, message):
+        self.erreurs.append((numero, identifiant, message))
+
+    def as_dict(self):
+        return {"lues": self.lues, "inserees": self.inserees,
+                "rejetees": len(self.erreurs), "erreurs": self.erreurs}
+
+
+def _normaliser(entete):
+    texte = unicodedata.normalize("NFKD", str(entete or "")).encode("ascii", "ignore").decode()
+    return ALIAS.get(texte.strip().lower(), texte.strip().lower())
+
+
+def _cellule(valeur):
+    if valeur is None:
+        return ""
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    if isinstance(valeur, date):
+        return valeur.strftime("%Y-%m-%d")
+    return str(valeur).strip()
+
+
+def iter_rows(fichier, nom_fichier):
+    """
+    Itère sur les lignes d'un fichier CSV/XLSX sous forme de dict.
+    Rend des couples (numero_de_ligne, dict) ; la ligne 1 est l'en-tête.
+    """
+    if nom_fichier.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        classeur = load_workbook(fichier, read_only=True, data_only=True)
+        try:
+            lignes = classeur.active.iter_rows(values_only=True)
+            entetes = [_normaliser(h) for h in next(lignes, ())]
+            for numero, valeurs in enumerate(lignes, start=2):
+                if not any(v not in (None, "") for v in valeurs):
+                    continue
+                yield numero, {h: _cellule(v) for h, v in zip(entetes, valeurs)}
+        finally:
+            classeur.close()
+        return
+
+    if isinstance(fichier, (str, os.PathLike)):
+        texte = open(fichier, encoding="utf-8-sig", newline="")
+    else:
+        texte = io.TextIOWrapper(fichier, encoding="utf-8-sig", newline="")
+    with texte:
+        debut = texte.read(4096)
+        texte.seek(0)
+        try:
+            dialecte = csv.Sniffer().sniff(debut, delimiters=",;\t")
+        except csv.Error:
+            dialecte = csv.excel
+        lecteur = csv.reader(texte, dialecte)
+        entetes = [_normaliser(h) for h in next(lecteur, [])]
+        for numero, valeurs in enumerate(lecteur, start=2):
+            if not any(v.strip() for v in valeurs):
+                continue
+            yield numero, {h: _cellule(v) for h, v in zip(entetes, valeurs)}
+
+
+def _paquets(iterable, taille):
+    paquet = []
+    for element in iterable:
+        paquet.append(element)
+        if len(paquet) >= taille:
+            yield paquet
+            paquet = []
+    if paquet:
+        yield paquet
+
+
+def import_stagiaires(conn, lignes, taille_paquet=TAILLE_PAQUET, max_workers=None):
+    """
+    Importe des stagiaires (nom_prenoms, bureau, paositra_money, matricule) et
+    crée leur compte utilisateur (username = mot de passe initial = matricule).
+    """
+    rapport = ImportReport()
+    cur = conn.cursor()
+    matricules = {r[0] for r in cur.execute("SELECT matricule FROM stagiaire")}
+    paositras = {r[0] for r in cur.execute("SELECT paositra_money FROM stagiaire")}
+    comptes = {r[0] for r in cur.execute("SELECT username FROM users")}
+
+    def valides():
+        for numero, ligne in lignes:
+            rapport.lues += 1
+            nom = ligne.get("nom_prenoms", "")
+            bureau = ligne.get("bureau", "")
+            paositra = ligne.get("paositra_money", "")
+            matricule = ligne.get("matricule", "")
+            if not (nom and bureau and paositra and matricule):
+                rapport.erreur(numero, matricule, "Champ manquant (nom, bureau, paositra, matricule)")
+                continue
+            if matricule in matricules:
+                rapport.erreur(numero, matricule, "Matricule déjà utilisé")
+                continue
+            if paositra in paositras:
+                rapport.erreur(numero, matricule, "PAOSITRA MONEY déjà utilisé")
+                continue
+            matricules.add(matricule)
+            paositras.add(paositra)
+            yield nom, paositra, bureau, matricule
+
+    # processus de hachage lancés sans fork (voir utils.jobs.mp_context)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context()) as pool:
+        for paquet in _paquets(valides(), taille_paquet):
+            nouveaux = [s[3] for s in paquet if s[3] not in comptes]
+            # Hachage en parallèle, avant d'ouvrir la transaction
+            hashes = list(pool.map(hash_password, nouveaux, chunksize=32))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO stagiaire (nom_prenoms, paositra_money, bureau, matricule) VALUES (?, ?, ?, ?)",
+                    paquet)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO users (username, password, role, matricule) VALUES (?, ?, 'user', ?)",
+                    [(m, h, m) for m, h in zip(nouveaux, hashes)])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            comptes.update(nouveaux)
+            rapport.inserees += len(paquet)
+    return rapport
+
+
+def import_presences(conn, lignes, taille_paquet=TAILLE_PAQUET):
+    """Importe des présences (matricule, date AAAA-MM-JJ, presence 0 / 0.5 / 1)."""
+    rapport = ImportReport()
+    ids = dict(conn.execute("SELECT matricule, id FROM stagiaire").fetchall())
+    fermees = archives.archived_years(conn)
+
+    def valides():
+        for numero, ligne in lignes:
+            rapport.lues += 1
+            matricule = ligne.get("matricule", "")
+            sid = ids.get(matricule)
+            if sid is None:
+                rapport.erreur(numero, matricule, "Matricule inconnu")
+                continue
+            try:
+                jour = date.fromisoformat(ligne.get("date", "")[:10]).isoformat()
+            except ValueError:
+                rapport.erreur(numero, matricule, f"Date invalide : {ligne.get('date')!r}")
+                continue
+            if int(jour[:4]) in fermees:
+                rapport.erreur(numero, matricule, f"Année {jour[:4]} archivée (lecture seule)")
+                continue
+            try:
+                valeur = float(ligne.get("presence", "").replace(",", "."))
+            except ValueError:
+                valeur = None
+            if valeur not in (0.0, 0.5, 1.0):
+                rapport.erreur(numero, matricule, f"Présence invalide : {ligne.get('presence')!r}")
+                continue
+            yield sid, jour, valeur
+
+    for paquet in _paquets(valides(), taille_paquet):
+        ecrites, _ = save_presences(conn, paquet)
+        rapport.inserees += ecrites
+    return rapport
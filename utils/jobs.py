@@ -0,0 +1,294 @@
+# utils/jobs.py
+"""
+Tâches de fond pour les exports longs (états PDF / Excel, ZIP d'états groupés).
+
+L'état des tâches est stocké dans la table `jobs` : n'importe quel worker
+gunicorn peut répondre au suivi ou au téléchargement d'une tâche lancée
+par un autre. Le rendu se fait dans un pool de processus propre à chaque
+worker, hors du cycle requête/réponse.
+
+Les processus du pool ne sont pas forkés depuis le worker : un fork d'un
+worker à threads (gunicorn_gthread.conf.py) recopierait des verrous et des
+connexions SQLite tenus par d'autres threads. Ils partent d'un serveur
+« forkserver » (spawn hors Linux) qui n'a chargé que ce module.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from utils.db import pooled
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    result_path TEXT,
+    download_name TEXT,
+    mimetype TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, updated_at);
+"""
+
+QUEUED, RUNNING, DONE, ERROR = "queued", "running", "done", "error"
+
+# kind -> fonction(job, params) retournant (fichier ouvert | BytesIO | bytes | chemin, download_name, mimetype)
+HANDLERS = {}
+
+
+def handler(kind):
+    def decorator(f):
+        HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+def mp_context():
+    """Contexte multiprocessing des pools de processus lancés depuis l'application."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexte = multiprocessing.get_context("forkserver")
+        # pas de réimport du script principal (gunicorn, flask, tests) dans le serveur
+        contexte.set_forkserver_preload(["utils.jobs"])
+        return contexte
+    return multiprocessing.get_context("spawn")
+
+
+def _now():
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+class Job:
+    """Contexte passé aux handlers (identifiant, configuration, progression)."""
+
+    def __init__(self, job_id, config):
+        self.id = job_id
+        self.config = config
+
+    @property
+    def db_path(self):
+        return self.config["db_path"]
+
+    def progress(self, valeur):
+        with pooled(self.db_path) as conn:
+            conn.execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                         (round(min(max(valeur, 0.0), 1.0), 3), _now(), self.id))
+            conn.commit()
+
+
+def _set(db_path, job_id, **champs):
+    champs["updated_at"] = _now()
+    colonnes = ", ".join(f"{c} = ?" for c in champs)
+    with pooled(db_path) as conn:
+        conn.execute(f"UPDATE jobs SET {colonnes} WHERE id = ?", (*champs.values(), job_id))
+        conn.commit()
+
+
+def run_job(config, job_id):
+    """Point d'entrée exécuté dans le processus du pool."""
+    db_path = config["db_path"]
+    with pooled(db_path) as conn:
+        row = conn.execute("SELECT kind, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return
+    kind, params = row[0], json.loads(row[1])
+    _set(db_path, job_id, status=RUNNING, progress=0.0)
+    try:
+        resultat, download_name, mimetype = HANDLERS[kind](Job(job_id, config), params)
+        path = os.path.join(config["result_dir"], job_id)
+        tmp = path + ".part"
+        if isinstance(resultat, (str, os.PathLike)):
+            shutil.copyfile(resultat, tmp)
+        elif hasattr(resultat, "read"):
+            # BytesIO ou fichier temporaire (exports Excel écrits en flux)
+            with resultat, open(tmp, "wb") as f:
+                shutil.copyfileobj(resultat, f)
+        else:
+            with open(tmp, "wb") as f:
+                f.write(resultat)
+        os.replace(tmp, path)
+        _set(db_path, job_id, status=DONE, progress=1.0, result_path=path,
+             download_name=download_name, mimetype=mimetype)
+    except Exception as e:
+        _set(db_path, job_id, status=ERROR, error=f"{type(e).__name__}: {e}")
+
+
+class JobRunner:
+    """Soumission et suivi des tâches ; un pool de processus par worker."""
+
+    def __init__(self, db_path, result_dir, max_workers=2, retention_hours=24, cache_dir=None,
+                 cache_max_bytes=0):
+        self.config = {"db_path": db_path, "result_dir": result_dir,
+                       "cache_dir": cache_dir, "cache_max_bytes": cache_max_bytes}
+        self.max_workers = max_workers
+        self.retention = timedelta(hours=retention_hours)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(result_dir, exist_ok=True)
+
+    def _pool(self, casse=None):
+        # Pool créé paresseusement, après le fork des workers gunicorn ; `casse` :
+        # pool dont un processus est mort (BrokenProcessPool), à remplacer
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid() or self._executor is casse:
+                if casse is not None and self._executor is casse:
+                    casse.shutdown(wait=False, cancel_futures=True)
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context())
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, conn, kind, params):
+        if kind not in HANDLERS:
+            raise ValueError(f"Type de tâche inconnu : {kind}")
+        self.cleanup(conn)
+        job_id = uuid.uuid4().hex
+        now = _now()
+        conn.execute("INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                     (job_id, kind, json.dumps(params), QUEUED, now, now))
+        conn.commit()
+        pool = self._pool()
+        try:
+            pool.submit(run_job, self.config, job_id)
+        except BrokenProcessPool:
+            self._pool(casse=pool).submit(run_job, self.config, job_id)
+        return job_id
+
+    def save_upload(self, fichier):
+        """Enregistre un fichier envoyé (FileStorage) pour une tâche d'import ; rend son chemin."""
+        # openpyxl choisit son lecteur d'après l'extension du fichier
+        extension = os.path.splitext(fichier.filename or "")[1].lower()
+        if extension not in (".csv", ".xlsx", ".xlsm"):
+            extension = ""
+        path = os.path.join(self.config["result_dir"], f"upload-{uuid.uuid4().hex}{extension}")
+        fichier.save(path)
+        return path
+
+    def cleanup(self, conn):
+        """Supprime les résultats expirés et marque en erreur les tâches orphelines."""
+        limite = (datetime.utcnow() - self.retention).isoformat(timespec="seconds")
+        for job_id, path, params in conn.execute(
+                "SELECT id, result_path, params FROM jobs WHERE created_at < ?", (limite,)).fetchall():
+            # fichier d'import resté en place si la tâche n'a jamais tourné
+            for chemin in (path, json.loads(params).get("fichier")):
+                if chemin and os.path.exists(chemin):
+                    os.remove(chemin)
+        conn.execute("DELETE FROM jobs WHERE created_at < ?", (limite,))
+        # Une tâche sans nouvelles depuis une heure a perdu son worker (redémarrage...)
+        bloquee = (datetime.utcnow() - timedelta(hours=1)).isoformat(timespec="seconds")
+        conn.execute("UPDATE jobs SET status = ?, error = 'Tâche interrompue' "
+                     "WHERE status IN (?, ?) AND updated_at < ?", (ERROR, QUEUED, RUNNING, bloquee))
+        conn.commit()
+
+
+def get_job(conn, job_id):
+    row = conn.execute("""SELECT id, kind, params, status, progress, result_path, download_name,
+                                 mimetype, error, created_at, updated_at
+                          FROM jobs WHERE id = ?""", (job_id,)).fetchone()
+    if row is None:
+        return None
+    cles = ("id", "kind", "params", "status", "progress", "result_path", "download_name",
+            "mimetype", "error", "created_at", "updated_at")
+    job = dict(zip(cles, row))
+    job["params"] = json.loads(job["params"])
+    return job
+
+
+def wait(conn, job_id, timeout=60.0, intervalle=0.2):
+    """Attend la fin d'une tâche (outils en ligne de commande, tests de charge)."""
+    fin = time.monotonic() + timeout
+    while time.monotonic() < fin:
+        job = get_job(conn, job_id)
+        if job and job["status"] in (DONE, ERROR):
+            return job
+        time.sleep(intervalle)
+    return get_job(conn, job_id)
+
+
+# ---------------- Handlers ----------------
+PDF_MIMETYPE = "application/pdf"
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIMETYPE = "application/zip"
+JSON_MIMETYPE = "application/json"
+
+
+@handler("export")
+def export_mensuel(job, params):
+    """État mensuel PDF ou Excel, via le cache d'exports s'il est configuré."""
+    from utils import versions
+    from utils.export_cache import ExportCache
+
+    fmt, mois, annee = params["format"], str(params["mois"]), str(params["annee"])
+    if fmt == "pdf":
+        from utils.export_pdf_officiel import generate_etat_presences_pdf as generer
+        nom, mimetype = f"Etat_présences_{annee}_{mois.zfill(2)}.pdf", PDF_MIMETYPE
+    elif fmt == "xlsx":
+        from utils.export_excel_officiel import generate_etat_presences_excel as generer
+        nom, mimetype = f"Etat_presences_{annee}_{mois.zfill(2)}.xlsx", XLSX_MIMETYPE
+    else:
+        raise ValueError(f"Format inconnu : {fmt}")
+    job.progress(0.1)
+
+    cache = None
+    if job.config.get("cache_dir"):
+        cache = ExportCache(job.config["cache_dir"], job.config["cache_max_bytes"])
+        with pooled(job.db_path) as conn:
+            key = ExportCache.key(fmt, annee, mois, versions.month_version(conn, annee, mois))
+        fichier = cache.get(key)
+        if fichier is not None:
+            with fichier:
+                return fichier.read(), nom, mimetype
+
+    sortie = generer(job.db_path, mois, annee)
+    job.progress(0.9)
+    if cache is not None:
+        cache.put(key, sortie).close()
+    return sortie, nom, mimetype
+
+
+@handler("batch")
+def export_groupe(job, params):
+    """ZIP d'états sur une période (utils.export_batch), rendu dans le processus de la tâche."""
+    import tempfile
+    from utils.calendrier import parse_month
+    from utils.export_batch import generate_batch_zip
+
+    debut, fin = params["debut"], params["fin"]
+    # ZIP sur un fichier temporaire supprimé à la fermeture, recopié dans le dossier des résultats
+    sortie = tempfile.TemporaryFile()
+    generate_batch_zip(job.db_path, parse_month(debut), parse_month(fin), sortie,
+                       bureaux=params.get("bureaux") or None, formats=params["formats"],
+                       par_bureau=params["par_bureau"], max_workers=1,
+                       progression=lambda part: job.progress(0.05 + 0.9 * part))
+    sortie.seek(0)
+    return sortie, f"Etats_presences_{debut}_{fin}.zip", ZIP_MIMETYPE
+
+
+@handler("import")
+def import_fichier(job, params):
+    """Import CSV / XLSX (utils.import_stagiaires) ; le résultat est le rapport d'import en JSON."""
+    from utils.import_stagiaires import import_presences, import_stagiaires, iter_rows
+
+    fichier = params["fichier"]
+    try:
+        job.progress(0.05)
+        lignes = iter_rows(fichier, params["nom"])
+        with pooled(job.db_path) as conn:
+            if params["type"] == "presences":
+                rapport = import_presences(conn, lignes)
+            else:
+                rapport = import_stagiaires(conn, lignes)
+    finally:
+        os.remove(fichier)
+    return json.dumps(rapport.as_dict(), ensure_ascii=False).encode(), "rapport_import.json", JSON_MIMETYPE
@@ -0,0 +1,280 @@
+# utils/metrics.py
+"""
+Instrumentation optionnelle (METRICS_ENABLED=1) :
+
+- durée et nombre de requêtes SQL, via une fabrique de connexions SQLite
+  chronométrées (utils/db.py l'utilise quand l'instrumentation est active) ;
+- latence des requêtes HTTP par endpoint ;
+- temps de rendu des états PDF / Excel ;
+- succès / échecs du cache de la liste des stagiaires (utils/roster.py) ;
+- un journal structuré (une ligne JSON par requête, par requête SQL lente
+  et par rendu d'état) sur le logger "gestion_stagiaire.metrics" ;
+- la page /metrics au format texte Prometheus, réservée aux sessions admin
+  ou au jeton METRICS_TOKEN (en-tête « Authorization: Bearer <jeton> ») ;
+- un profil cProfile pour une fraction des requêtes (PROFILE_SAMPLE_RATE),
+  écrit dans PROFILE_DIR (fichiers .prof lisibles avec pstats / snakeviz).
+
+Les compteurs sont propres à chaque processus (label `pid`) : avec
+plusieurs workers gunicorn, Prometheus agrège les séries de chaque worker.
+"""
+import contextvars
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+ENABLED = os.environ.get("METRICS_ENABLED", "0").lower() in ("1", "true", "yes", "on")
+# Requêtes SQL plus lentes que ce seuil journalisées avec leur texte
+SLOW_QUERY_MS = float(os.environ.get("METRICS_SLOW_QUERY_MS", "100"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+# Jeton du collecteur Prometheus ; vide = /metrics réservée aux sessions admin
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("gestion_stagiaire.metrics")
+
+
+def log_event(evenement, **champs):
+    logger.info(json.dumps({"event": evenement, "pid": os.getpid(), **champs}, ensure_ascii=False, default=str))
+
+
+# ---------------- Registre ----------------
+class _Metric:
+    def __init__(self, name, help_text, kind):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._series = {}
+
+    @staticmethod
+    def _cle(labels):
+        return tuple(sorted(labels.items()))
+
+    @staticmethod
+    def _labels(cle, extra=()):
+        paires = list(cle) + list(extra) + [("pid", os.getpid())]
+        return "{" + ",".join(f'{k}="{_echapper(v)}"' for k, v in paires) + "}"
+
+
+class Counter(_Metric):
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text, "counter")
+
+    def inc(self, valeur=1.0, **labels):
+        cle = self._cle(labels)
+        with self._lock:
+            self._series[cle] = self._series.get(cle, 0.0) + valeur
+
+    def render(self):
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.name}{self._labels(cle)} {valeur:g}" for cle, valeur in series]
+
+
+class Histogram(_Metric):
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, "histogram")
+        self.buckets = buckets
+
+    def observe(self, valeur, **labels):
+        cle = self._cle(labels)
+        with self._lock:
+            serie = self._series.get(cle)
+            if serie is None:
+                serie = self._series[cle] = [[0] * len(self.buckets), 0.0, 0]
+            for i, borne in enumerate(self.buckets):
+                if valeur <= borne:
+                    serie[0][i] += 1
+            serie[1] += valeur
+            serie[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = [(cle, list(s[0]), s[1], s[2]) for cle, s in self._series.items()]
+        lignes = []
+        for cle, comptes, somme, total in series:
+            for borne, nb in zip(self.buckets, comptes):
+                lignes.append(f"{self.name}_bucket{self._labels(cle, [('le', f'{borne:g}')])} {nb}")
+            lignes.append(f"{self.name}_bucket{self._labels(cle, [('le', '+Inf')])} {total}")
+            lignes.append(f"{self.name}_sum{self._labels(cle)} {somme:g}")
+            lignes.append(f"{self.name}_count{self._labels(cle)} {total}")
+        return lignes
+
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requêtes HTTP traitées")
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Latence des requêtes HTTP par endpoint")
+DB_QUERIES = Counter("db_queries_total", "Requêtes SQL exécutées")
+DB_DURATION = Counter("db_query_seconds_total", "Temps passé dans l'exécution des requêtes SQL")
+EXPORT_DURATION = Histogram("export_render_seconds", "Temps de rendu des états PDF / Excel")
+ROSTER_CACHE = Counter("roster_cache_requests_total", "Lectures de la liste des stagiaires (hit / miss du cache)")
+METRICS = (HTTP_REQUESTS, HTTP_DURATION, DB_QUERIES, DB_DURATION, EXPORT_DURATION, ROSTER_CACHE)
+
+
+def render_prometheus():
+    lignes = []
+    for metrique in METRICS:
+        lignes.append(f"# HELP {metrique.name} {metrique.help}")
+        lignes.append(f"# TYPE {metrique.name} {metrique.kind}")
+        lignes.extend(metrique.render())
+    return "\n".join(lignes) + "\n"
+
+
+# ---------------- SQL chronométré ----------------
+class _Statistiques:
+    """Compteurs de la requête HTTP en cours."""
+    __slots__ = ("endpoint", "requetes", "duree_sql")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requetes = 0
+        self.duree_sql = 0.0
+
+
+_courantes = contextvars.ContextVar("metrics_requete", default=None)
+
+
+def _enregistrer_sql(sql, duree):
+    stats = _courantes.get()
+    endpoint = stats.endpoint if stats is not None else "hors_requete"
+    if stats is not None:
+        stats.requetes += 1
+        stats.duree_sql += duree
+    DB_QUERIES.inc(endpoint=endpoint)
+    DB_DURATION.inc(duree, endpoint=endpoint)
+    if duree * 1000 >= SLOW_QUERY_MS:
+        log_event("slow_query", endpoint=endpoint, duration_ms=round(duree * 1000, 2), sql=" ".join(sql.split()))
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Curseur chronométrant execute() / executemany() (hors lecture des lignes)."""
+
+    def execute(self, sql, parameters=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _enregistrer_sql(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, seq_of_parameters):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _enregistrer_sql(sql, time.perf_counter() - t0)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Fabrique passée à sqlite3.connect(factory=...)."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ---------------- Rendus d'états ----------------
+def timed_render(fmt):
+    """Décorateur mesurant la durée d'un rendu d'état (`fmt` : 'pdf' ou 'xlsx')."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return f(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                duree = time.perf_counter() - t0
+                EXPORT_DURATION.observe(duree, format=fmt)
+                log_event("export_render", format=fmt, function=f.__name__, duration_ms=round(duree * 1000, 1))
+        return wrapper
+    return decorator
+
+
+# ---------------- Flask ----------------
+def init_app(app):
+    """Branche les hooks de mesure et la page /metrics si METRICS_ENABLED."""
+    if not ENABLED:
+        return
+    from flask import Response, abort, g, request, session
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    if PROFILE_SAMPLE_RATE > 0:
+        os.makedirs(PROFILE_DIR or os.path.join(app.instance_path, "profiles"), exist_ok=True)
+
+    @app.before_request
+    def _debut():
+        g._metrics_t0 = time.perf_counter()
+        g._metrics_jeton = _courantes.set(_Statistiques(request.endpoint or "inconnu"))
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            g._metrics_profil = cProfile.Profile()
+            g._metrics_profil.enable()
+
+    @app.after_request
+    def _fin(response):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is None:
+            return response
+        duree = time.perf_counter() - t0
+        stats = _courantes.get()
+        endpoint = stats.endpoint
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        HTTP_DURATION.observe(duree, endpoint=endpoint)
+        profil = g.pop("_metrics_profil", None)
+        fichier = None
+        if profil is not None:
+            profil.disable()
+            fichier = os.path.join(PROFILE_DIR or os.path.join(app.instance_path, "profiles"),
+                                   f"{endpoint}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+            profil.dump_stats(fichier)
+        log_event("request", endpoint=endpoint, method=request.method, path=request.path,
+                  status=response.status_code, duration_ms=round(duree * 1000, 2),
+                  queries=stats.requetes, sql_ms=round(stats.duree_sql * 1000, 2), profile=fichier)
+        return response
+
+    @app.teardown_request
+    def _nettoyage(exc):
+        # exécuté même si la vue a levé une exception (after_request ne l'est pas)
+        profil = g.pop("_metrics_profil", None)
+        if profil is not None:
+            profil.disable()
+        jeton = g.pop("_metrics_jeton", None)
+        if jeton is not None:
+            _courantes.reset(jeton)
+
+    def _autorise():
+        if session.get("role") == "admin":
+            return True
+        if not METRICS_TOKEN:
+            return False
+        schema, _, jeton = request.headers.get("Authorization", "").partition(" ")
+        return schema.lower() == "bearer" and hmac.compare_digest(jeton.strip().encode(), METRICS_TOKEN.encode())
+
+    @app.route("/metrics")
+    def metrics():
+        # noms d'endpoints, latences et requêtes lentes : pas d'accès anonyme
+        if not _autorise():
+            abort(401 if "user_id" not in session else 403)
+        return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,136 @@
+# utils/migrations.py
+"""
+Migrations du schéma SQLite, versionnées avec PRAGMA user_version.
+
+Chaque migration est appliquée une seule fois, dans une transaction
+BEGIN IMMEDIATE : plusieurs workers gunicorn peuvent démarrer en même
+temps sans appliquer deux fois la même étape.
+"""
+import sqlite3
+
+from utils import archives, calendrier, changelog, rollup, versions, jobs
+
+
+def _schema_de_base(cur):
+    # Schéma historique d'init_db.py (sans effet si les tables existent déjà)
+    cur.execute("""CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL,
+        matricule TEXT
+    )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS stagiaire (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nom_prenoms TEXT NOT NULL,
+        paositra_money TEXT UNIQUE NOT NULL,
+        bureau TEXT NOT NULL,
+        matricule TEXT UNIQUE NOT NULL
+    )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS presences (
+        stagiaire_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        presence REAL NOT NULL,
+        time TEXT,
+        PRIMARY KEY (stagiaire_id, date)
+    )""")
+
+
+def _index_presences_date(cur):
+    # Requêtes par mois (recap, exports) : parcours d'intervalle sur date.
+    # `presence` est incluse pour que l'index soit couvrant.
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_presences_date
+                   ON presences (date, stagiaire_id, presence)""")
+    cur.execute("ANALYZE")
+
+
+def _split_sql(script):
+    # executescript() validerait la transaction en cours : on découpe le
+    # script en instructions complètes (les triggers contiennent des ';').
+    instruction = ""
+    for ligne in script.splitlines(keepends=True):
+        instruction += ligne
+        if sqlite3.complete_statement(instruction):
+            yield instruction.strip()
+            instruction = ""
+
+
+def _run_script(cur, script):
+    for instruction in _split_sql(script):
+        cur.execute(instruction)
+
+
+def _presence_monthly(cur):
+    _run_script(cur, rollup.SCHEMA)
+    rollup.rebuild(cur.connection)
+
+
+def _data_version(cur):
+    _run_script(cur, versions.SCHEMA)
+
+
+def _jobs(cur):
+    _run_script(cur, jobs.SCHEMA)
+
+
+def _colonne_time(cur):
+    # Colonne déclarée par init_db.py mais absente des bases plus anciennes
+    colonnes = [r[1] for r in cur.execute("PRAGMA table_info(presences)")]
+    if "time" not in colonnes:
+        cur.execute("ALTER TABLE presences ADD COLUMN time TEXT")
+
+
+def _jours_feries(cur):
+    _run_script(cur, calendrier.SCHEMA)
+    calendrier.seed_feries(cur.connection, calendrier.ANNEES_PAR_DEFAUT)
+
+
+def _changelog(cur):
+    _run_script(cur, changelog.SCHEMA)
+
+
+def _archives(cur):
+    _run_script(cur, archives.SCHEMA)
+
+
+MIGRATIONS = [
+    (1, "schéma de base (users, stagiaire, presences)", _schema_de_base),
+    (2, "index presences(date, stagiaire_id)", _index_presences_date),
+    (3, "synthèse mensuelle presence_monthly + triggers", _presence_monthly),
+    (4, "compteurs de version data_version + triggers", _data_version),
+    (5, "table des tâches de fond jobs", _jobs),
+    (6, "colonne presences.time", _colonne_time),
+    (7, "table jours_feries (fêtes légales malgaches) + triggers", _jours_feries),
+    (8, "journal des modifications changelog + triggers", _changelog),
+    (9, "registre des années archivées + triggers de lecture seule", _archives),
+]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(db_path, verbose=False):
+    """Applique les migrations manquantes. Retourne la version finale."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        for version, description, etape in MIGRATIONS:
+            if current_version(conn) >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Un autre processus a pu migrer pendant qu'on attendait le verrou
+                if current_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                etape(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if verbose:
+                print(f"Migration {version} appliquée : {description}")
+        return current_version(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,35 @@
+# utils/offload.py
+"""
+Pool de threads borné pour les traitements lourds exécutés pendant une
+requête (rendu ReportLab / xlsxwriter).
+
+Avec des workers à threads (gunicorn_gthread.conf.py), des dizaines de
+requêtes partagent un processus : au plus RENDER_THREADS rendus tournent
+en même temps, les autres attendent leur tour, et les threads restants
+continuent de servir pointages et lectures au lieu de se disputer le GIL
+sur des rendus concurrents.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+RENDER_THREADS = int(os.environ.get("RENDER_THREADS", "2"))
+
+_executor = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _pid
+    # Pool créé paresseusement, après le fork des workers gunicorn
+    with _lock:
+        if _executor is None or _pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=RENDER_THREADS, thread_name_prefix="rendu")
+            _pid = os.getpid()
+        return _executor
+
+
+def run(fn, *args, **kwargs):
+    """Exécute `fn` dans le pool borné et attend son résultat."""
+    return _pool().submit(fn, *args, **kwargs).result()
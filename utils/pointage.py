@@ -0,0 +1,90 @@
+# utils/pointage.py
+"""
+Pointage d'arrivée : individuel (/user/presence) ou par lots depuis une
+borne (kiosque) qui met les pointages en file quand la liaison est lente
+ou coupée, puis les envoie par centaines.
+
+Un lot est écrit dans une seule transaction ; la clé (stagiaire_id, date)
+de presences fait le dédoublonnage, y compris à l'intérieur du lot, et
+chaque pointage reçoit son propre résultat.
+"""
+import os
+from datetime import datetime, timedelta
+
+from utils import archives
+
+CHECKIN_SQL = """INSERT INTO presences (stagiaire_id, date, presence, time)
+                 SELECT id, ?, 1.0, ? FROM stagiaire WHERE id = ?
+                 ON CONFLICT(stagiaire_id, date) DO NOTHING"""
+
+# Pointages par requête, avance tolérée de l'horloge d'une borne, et ancienneté
+# maximale d'un pointage (file d'une borne restée longtemps hors ligne)
+BATCH_MAX = 1000
+MAX_AVANCE = timedelta(minutes=5)
+MAX_RETARD = timedelta(days=int(os.environ.get("CHECKIN_MAX_AGE_DAYS", "7")))
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+UNKNOWN = "unknown_matricule"
+INVALID = "invalid"
+REJECTED = "rejete"
+
+
+def _horodatage(valeur):
+    try:
+        return datetime.fromisoformat(str(valeur))
+    except ValueError:
+        return None
+
+
+def ingest_checkins(conn, roster, pointages, maintenant=None):
+    """
+    Enregistre un lot de pointages de borne.
+
+    - roster : utils.roster.Roster (matricule -> stagiaire)
+    - pointages : itérable de dicts {"matricule": ..., "timestamp": "AAAA-MM-JJTHH:MM:SS"}
+
+    Retourne une liste de résultats alignée sur `pointages` : CREATED,
+    DUPLICATE (déjà pointé ce jour-là), UNKNOWN, INVALID (heure illisible,
+    dans le futur ou dans une année archivée) ou REJECTED (plus ancien que
+    MAX_RETARD : une borne ne saisit pas de présences passées).
+    """
+    maintenant = maintenant or datetime.now()
+    limite = maintenant + MAX_AVANCE
+    plancher = maintenant - MAX_RETARD
+    fermees = archives.archived_years(conn)
+    resultats = []
+    a_ecrire = []
+    for i, p in enumerate(pointages):
+        stagiaire = roster.by_matricule(str(p.get("matricule", "")).strip()) if isinstance(p, dict) else None
+        quand = _horodatage(p.get("timestamp")) if isinstance(p, dict) else None
+        if quand is not None and quand.tzinfo is not None:
+            # heure locale de la borne attendue ; une heure avec fuseau est ramenée à l'heure du serveur
+            quand = quand.astimezone().replace(tzinfo=None)
+        if quand is None or quand > limite or quand.year in fermees:
+            resultats.append(INVALID)
+        elif quand < plancher:
+            resultats.append(REJECTED)
+        elif stagiaire is None:
+            resultats.append(UNKNOWN)
+        else:
+            resultats.append(None)
+            a_ecrire.append((i, quand.strftime("%Y-%m-%d"), quand.strftime("%H:%M:%S"), stagiaire[0]))
+
+    if a_ecrire:
+        # transaction de l'appelant déjà ouverte : c'est à lui de la valider
+        proprietaire = not conn.in_transaction
+        if proprietaire:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.cursor()
+            for i, jour, heure, sid in a_ecrire:
+                cur.execute(CHECKIN_SQL, (jour, heure, sid))
+                resultats[i] = CREATED if cur.rowcount == 1 else DUPLICATE
+            if proprietaire:
+                conn.commit()
+        except Exception:
+            if proprietaire:
+                conn.rollback()
+            raise
+    return resultats
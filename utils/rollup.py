@@ -0,0 +1,88 @@
+# utils/rollup.py
+"""
+Table de synthèse mensuelle `presence_monthly`.
+
+Une ligne par (stagiaire, mois) avec le total de jours, le nombre de
+demi-journées et d'absences. Elle est tenue à jour par des triggers sur
+`presences` (toutes les écritures y passent), et peut être reconstruite
+entièrement avec `rebuild()` (commande `flask --app app rebuild-monthly`).
+"""
+from utils import archives
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS presence_monthly (
+    stagiaire_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,
+    total_days REAL NOT NULL DEFAULT 0,
+    half_days INTEGER NOT NULL DEFAULT 0,
+    absent_days INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (year_month, stagiaire_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_monthly_insert
+AFTER INSERT ON presences
+BEGIN
+    INSERT INTO presence_monthly (stagiaire_id, year_month, total_days, half_days, absent_days)
+    VALUES (NEW.stagiaire_id, substr(NEW.date, 1, 7), NEW.presence,
+            NEW.presence = 0.5, NEW.presence = 0)
+    ON CONFLICT (year_month, stagiaire_id) DO UPDATE SET
+        total_days = total_days + excluded.total_days,
+        half_days = half_days + excluded.half_days,
+        absent_days = absent_days + excluded.absent_days;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_monthly_delete
+AFTER DELETE ON presences
+BEGIN
+    UPDATE presence_monthly SET
+        total_days = total_days - OLD.presence,
+        half_days = half_days - (OLD.presence = 0.5),
+        absent_days = absent_days - (OLD.presence = 0)
+    WHERE year_month = substr(OLD.date, 1, 7) AND stagiaire_id = OLD.stagiaire_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_monthly_update
+AFTER UPDATE OF stagiaire_id, date, presence ON presences
+BEGIN
+    UPDATE presence_monthly SET
+        total_days = total_days - OLD.presence,
+        half_days = half_days - (OLD.presence = 0.5),
+        absent_days = absent_days - (OLD.presence = 0)
+    WHERE year_month = substr(OLD.date, 1, 7) AND stagiaire_id = OLD.stagiaire_id;
+    INSERT INTO presence_monthly (stagiaire_id, year_month, total_days, half_days, absent_days)
+    VALUES (NEW.stagiaire_id, substr(NEW.date, 1, 7), NEW.presence,
+            NEW.presence = 0.5, NEW.presence = 0)
+    ON CONFLICT (year_month, stagiaire_id) DO UPDATE SET
+        total_days = total_days + excluded.total_days,
+        half_days = half_days + excluded.half_days,
+        absent_days = absent_days + excluded.absent_days;
+END;
+"""
+
+
+def year_month(annee, mois):
+    return f"{int(annee):04d}-{int(mois):02d}"
+
+
+def rebuild(conn):
+    """Recalcule toute la table depuis `presences` (années archivées comprises). Retourne le nombre de lignes."""
+    # Source calculée avant le DELETE : l'ATTACH des archives est impossible dans une transaction
+    source = archives.presences_source(conn)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM presence_monthly")
+    cur.execute(f"""
+        INSERT INTO presence_monthly (stagiaire_id, year_month, total_days, half_days, absent_days)
+        SELECT stagiaire_id, substr(date, 1, 7), SUM(presence),
+               SUM(presence = 0.5), SUM(presence = 0)
+        FROM {source}
+        GROUP BY substr(date, 1, 7), stagiaire_id
+    """)
+    return cur.execute("SELECT COUNT(*) FROM presence_monthly").fetchone()[0]
+
+
+def monthly_totals(conn, annee, mois):
+    """{stagiaire_id: total_days} pour un mois, lu dans la synthèse."""
+    cur = conn.execute(
+        "SELECT stagiaire_id, total_days FROM presence_monthly WHERE year_month = ?",
+        (year_month(annee, mois),))
+    return dict(cur.fetchall())
@@ -0,0 +1,155 @@
+# utils/roster.py
+"""
+Cache par processus de la liste des stagiaires.
+
+La liste change rarement (ajout, modification, suppression, import) alors
+que presque toutes les pages la relisent. Chaque worker garde une copie
+en mémoire, valable tant que la portée 'roster' de `data_version` n'a pas
+bougé : les triggers de stagiaire l'incrémentent à chaque écriture, d'où
+qu'elle vienne (autre worker gunicorn, import en ligne de commande...).
+Une requête ne paie donc plus qu'une lecture de clé primaire au lieu d'un
+parcours de la table.
+
+Les pages (recherche par préfixe, pagination par clé) suivent l'ordre de
+SQLite, tri NOCASE compris, sans requête sur la table.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+
+from utils import metrics, versions
+from utils.stagiaires import COLONNES, FIN_PREFIXE, PAGE_MAX, TRIS
+
+# Collation NOCASE de SQLite : seules les lettres ASCII sont repliées
+_NOCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def nocase(texte):
+    return texte.translate(_NOCASE)
+
+
+class Roster:
+    """Liste figée des stagiaires (tuples dans l'ordre de COLONNES) pour une version."""
+
+    def __init__(self, version, lignes):
+        self.version = version
+        self.lignes = lignes
+        self._par_id = {l[0]: l for l in lignes}
+        self._par_matricule = {l[4]: l for l in lignes}
+        # tri -> (clés (valeur, id) triées, lignes dans le même ordre), en tout et par bureau
+        self._tris = {}
+        self._tris_bureau = {}
+        for tri in TRIS:
+            cle = self._cle(tri)
+            ordonnees = sorted(lignes, key=cle)
+            self._tris[tri] = ([cle(l) for l in ordonnees], ordonnees)
+            groupes = {}
+            for l in ordonnees:
+                groupes.setdefault(l[3], []).append(l)
+            for bureau, groupe in groupes.items():
+                self._tris_bureau[tri, bureau] = ([cle(l) for l in groupe], groupe)
+        self.bureaux = sorted({l[3] for l in lignes})
+
+    def __len__(self):
+        return len(self.lignes)
+
+    def get(self, stagiaire_id):
+        return self._par_id.get(stagiaire_id)
+
+    def by_matricule(self, matricule):
+        return self._par_matricule.get(matricule)
+
+    def by_matricule_order(self, bureaux=None):
+        """Lignes triées par matricule, éventuellement limitées à des bureaux."""
+        lignes = self._tris["matricule"][1]
+        if bureaux:
+            bureaux = set(bureaux)
+            return [l for l in lignes if l[3] in bureaux]
+        return list(lignes)
+
+    @staticmethod
+    def _cle(tri):
+        if tri == "nom":
+            return lambda l: (nocase(l[1]), l[0])
+        position = TRIS[tri]
+        return lambda l: (l[position], l[0])
+
+    def _prefixe(self, tri, debut, fin):
+        """Lignes dont la clé de `tri` est dans [debut, fin[ (recherche par index)."""
+        cles, ordonnees = self._tris[tri]
+        return ordonnees[bisect_left(cles, (debut,)):bisect_left(cles, (fin,))]
+
+    def page(self, q=None, bureau=None, sort="matricule", after=None, after_id=None, limit=50):
+        """
+        Une page de stagiaires (tuples dans l'ordre de COLONNES).
+        Retourne (lignes, curseur_suivant) ; curseur_suivant vaut None en fin de liste,
+        sinon un dict {"after": ..., "after_id": ...} à renvoyer pour la page suivante.
+        """
+        if sort not in TRIS:
+            sort = "matricule"
+        position = TRIS[sort]
+        limit = max(1, min(int(limit), PAGE_MAX))
+        cle = self._cle(sort)
+        if q:
+            # union des deux plages de préfixe (nom, matricule)
+            q = q.strip()
+            trouves = {l[0]: l for l in self._prefixe("nom", nocase(q), nocase(q) + FIN_PREFIXE)}
+            trouves.update((l[0], l) for l in self._prefixe("matricule", q, q + FIN_PREFIXE))
+            ordonnees = sorted((l for l in trouves.values() if not bureau or l[3] == bureau), key=cle)
+            cles = [cle(l) for l in ordonnees]
+        elif bureau:
+            cles, ordonnees = self._tris_bureau.get((sort, bureau), ([], []))
+        else:
+            cles, ordonnees = self._tris[sort]
+        debut = 0
+        if after is not None:
+            debut = bisect_right(cles, (nocase(after) if sort == "nom" else after, after_id or 0))
+
+        lignes = ordonnees[debut:debut + limit + 1]
+        suivant = None
+        if len(lignes) > limit:
+            lignes = lignes[:limit]
+            dernier = lignes[-1]
+            suivant = {"after": dernier[position], "after_id": dernier[0]}
+        return lignes, suivant
+
+
+class RosterCache:
+    """Un Roster par base, rechargé quand la version 'roster' change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rosters = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn):
+        base = conn.execute("PRAGMA database_list").fetchone()[2]
+        version = versions.get_version(conn, versions.ROSTER)[0]
+        roster = self._rosters.get(base)
+        if roster is not None and roster.version == version:
+            self.hits += 1
+            metrics.ROSTER_CACHE.inc(result="hit")
+            return roster
+        with self._lock:
+            roster = self._rosters.get(base)
+            if roster is None or roster.version != version:
+                self.misses += 1
+                metrics.ROSTER_CACHE.inc(result="miss")
+                lignes = conn.execute(f"SELECT {', '.join(COLONNES)} FROM stagiaire").fetchall()
+                roster = self._rosters[base] = Roster(version, lignes)
+            else:
+                self.hits += 1
+                metrics.ROSTER_CACHE.inc(result="hit")
+        return roster
+
+    def clear(self):
+        with self._lock:
+            self._rosters.clear()
+
+
+cache = RosterCache()
+
+
+def get_roster(conn):
+    """Liste des stagiaires de la base de `conn`, depuis le cache du processus."""
+    return cache.get(conn)
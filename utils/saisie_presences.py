@@ -0,0 +1,49 @@
+# utils/saisie_presences.py
+"""Écriture groupée des présences (une transaction, un seul executemany)."""
+
+UPSERT_PRESENCE = """
+    INSERT INTO presences (stagiaire_id, date, presence)
+    VALUES (?, ?, ?)
+    ON CONFLICT(stagiaire_id, date) DO UPDATE SET presence = excluded.presence
+"""
+
+
+def save_presences(conn, rows, existing=None):
+    """
+    Enregistre un lot de présences.
+
+    - rows : itérable de (stagiaire_id, date 'AAAA-MM-JJ', presence)
+    - existing : {(stagiaire_id, date): presence} déjà en base ; les lignes
+      dont la valeur ne change pas ne sont pas réécrites.
+
+    Si `conn` est déjà dans une transaction, les lignes y sont ajoutées et
+    l'appelant reste seul à la valider ou l'annuler.
+
+    Retourne (lignes_ecrites, lignes_ignorees).
+    """
+    existing = existing or {}
+    a_ecrire = []
+    ignorees = 0
+    for sid, jour, valeur in rows:
+        sid, valeur = int(sid), float(valeur)
+        ancienne = existing.get((sid, jour))
+        if ancienne is not None and float(ancienne) == valeur:
+            ignorees += 1
+            continue
+        a_ecrire.append((sid, jour, valeur))
+
+    if a_ecrire:
+        # Transaction explicite : le verrou d'écriture est pris d'emblée
+        # au lieu d'être promu en cours de route.
+        proprietaire = not conn.in_transaction
+        if proprietaire:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT_PRESENCE, a_ecrire)
+            if proprietaire:
+                conn.commit()
+        except Exception:
+            if proprietaire:
+                conn.rollback()
+            raise
+    return len(a_ecrire), ignorees
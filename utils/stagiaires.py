@@ -0,0 +1,33 @@
+# utils/stagiaires.py
+"""
+Liste des stagiaires paginée côté serveur : colonnes, tris et paramètres.
+
+Pagination par clé (keyset / seek) : la page suivante repart de la
+dernière clé vue (`after`, `after_id`) au lieu d'un OFFSET. La recherche
+est un préfixe sur le nom (insensible à la casse) ou le matricule. Les
+pages sont servies par le cache de la liste (utils.roster).
+"""
+
+COLONNES = ("id", "nom_prenoms", "paositra_money", "bureau", "matricule")
+
+# tri -> index de la colonne dans COLONNES
+TRIS = {
+    "matricule": 4,
+    "nom": 1,
+}
+
+PAGE_MAX = 500
+FIN_PREFIXE = "\U0010ffff"
+
+
+def page_args(args):
+    """Paramètres de pagination/recherche lus dans request.args."""
+    return {
+        "q": args.get("q") or None,
+        "bureau": args.get("bureau") or None,
+        "sort": args.get("sort", "matricule"),
+        "after": args.get("after"),
+        # curseur illisible (after_id=x) : ignoré, la page reprend juste après `after`
+        "after_id": args.get("after_id", type=int),
+        "limit": args.get("limit", 50, type=int),
+    }
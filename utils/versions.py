@@ -0,0 +1,96 @@
+# utils/versions.py
+"""
+Compteurs de version des données, tenus par triggers dans `data_version`.
+
+- une portée par mois ('2025-04') incrémentée à chaque écriture dans presences ;
+- la portée 'roster' incrémentée à chaque écriture dans stagiaire ;
+- la portée 'calendrier' incrémentée à chaque écriture dans jours_feries
+  (triggers de utils/calendrier.py).
+
+Ils servent de clé d'invalidation (cache d'exports, ETag...).
+"""
+
+ROSTER = "roster"
+CALENDRIER = "calendrier"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_version (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_version_insert
+AFTER INSERT ON presences
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES (substr(NEW.date, 1, 7), 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_version_update
+AFTER UPDATE ON presences
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES (substr(OLD.date, 1, 7), 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+    INSERT INTO data_version (scope, version, updated_at)
+    SELECT substr(NEW.date, 1, 7), 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+    WHERE substr(NEW.date, 1, 7) <> substr(OLD.date, 1, 7)
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_presences_version_delete
+AFTER DELETE ON presences
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES (substr(OLD.date, 1, 7), 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stagiaire_version_insert
+AFTER INSERT ON stagiaire
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES ('roster', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stagiaire_version_update
+AFTER UPDATE ON stagiaire
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES ('roster', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stagiaire_version_delete
+AFTER DELETE ON stagiaire
+BEGIN
+    INSERT INTO data_version (scope, version, updated_at)
+    VALUES ('roster', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+"""
+
+
+def month_scope(annee, mois):
+    return f"{int(annee):04d}-{int(mois):02d}"
+
+
+def get_version(conn, scope):
+    """(version, updated_at) d'une portée ; (0, None) si jamais modifiée."""
+    row = conn.execute("SELECT version, updated_at FROM data_version WHERE scope = ?", (scope,)).fetchone()
+    return row if row else (0, None)
+
+
+def month_version(conn, annee, mois):
+    """
+    Version des données d'un état mensuel : présences du mois + liste des
+    stagiaires (noms, matricules...) + jours fériés (jours grisés de l'état).
+    Retourne (version_mois, version_roster, version_calendrier).
+    """
+    rows = dict(conn.execute(
+        "SELECT scope, version FROM data_version WHERE scope IN (?, ?, ?)",
+        (month_scope(annee, mois), ROSTER, CALENDRIER)).fetchall())
+    return rows.get(month_scope(annee, mois), 0), rows.get(ROSTER, 0), rows.get(CALENDRIER, 0)